@@ -0,0 +1,131 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import filecmp
+import functools
+import glob
+import hashlib
+import os
+import shutil
+import tempfile
+import typing
+
+CACHE_DIRECTORY = ".asm_cache"
+# The cache keeps at most this many outputs. Storing a new one evicts the
+# least recently used ones. The whole cache can be cleared by deleting its
+# directory.
+MAX_ENTRIES = 256
+
+
+@functools.lru_cache(maxsize=None)
+def assembler_version() -> str:
+    """Computed once per process, however many files are assembled.
+
+    Returns:
+        str: a hash of the assembler's source code. Any change to the
+        assembler invalidates everything it has cached.
+    """
+    digest = hashlib.sha256()
+    for source_path in sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), "*.py"))):
+        with open(source_path, 'rb') as source_file:
+            digest.update(source_file.read())
+    return digest.hexdigest()
+
+
+class AssemblyCache:
+    """A persistent cache of assembled programs, kept in a directory next to
+    the outputs. Entries are keyed by a hash of the input's content, the
+    assembler version and the output format, so a file is only re-assembled
+    when one of those changes. Only the MAX_ENTRIES most recently used outputs
+    are kept.
+    """
+
+    def __init__(self, output_directory: str, version: typing.Optional[str] = None,
+                 max_entries: int = MAX_ENTRIES) -> None:
+        """
+        Args:
+            output_directory (str): the directory the outputs are written to.
+                The cache is kept in a sub-directory of it.
+            version (typing.Optional[str]): the assembler version, computed by
+                assembler_version if not given.
+            max_entries (int): the number of outputs to keep.
+        """
+        self.__directory = os.path.join(output_directory, CACHE_DIRECTORY)
+        self.__version = assembler_version() if version is None else version
+        self.__max_entries = max_entries
+
+    def key(self, input_path: str, output_format: str) -> str:
+        """
+        Args:
+            input_path (str): path of an .asm file.
+            output_format (str): identifies the kind of output, e.g. "hack".
+
+        Returns:
+            str: the cache key of assembling the file into the given format.
+        """
+        digest = hashlib.sha256()
+        digest.update(self.__version.encode())
+        digest.update(output_format.encode() + b"\0")
+        with open(input_path, 'rb') as input_file:
+            digest.update(input_file.read())
+        return digest.hexdigest()
+
+    def restore(self, key: str, output_path: str) -> bool:
+        """Restores a cached output. An output that is already up to date is
+        left untouched.
+
+        Args:
+            key (str): the cache key of the output.
+            output_path (str): where the output should be.
+
+        Returns:
+            bool: True if the output was found in the cache, False otherwise.
+        """
+        cached_path = os.path.join(self.__directory, key)
+        if not os.path.isfile(cached_path):
+            return False
+        try:
+            if not (os.path.isfile(output_path) and filecmp.cmp(cached_path, output_path, shallow=False)):
+                shutil.copyfile(cached_path, output_path)
+            os.utime(cached_path)  # Marks the entry as recently used
+        except FileNotFoundError:  # Evicted by another process meanwhile
+            return False
+        return True
+
+    def store(self, key: str, output_path: str) -> None:
+        """Adds a freshly assembled output to the cache.
+
+        Args:
+            key (str): the cache key of the output.
+            output_path (str): the output to store.
+        """
+        os.makedirs(self.__directory, exist_ok=True)
+        # Copy to a temporary file first, so a concurrent reader never sees a
+        # partially written entry.
+        handle, temporary_path = tempfile.mkstemp(dir=self.__directory)
+        os.close(handle)
+        shutil.copyfile(output_path, temporary_path)
+        os.replace(temporary_path, os.path.join(self.__directory, key))
+        self.__evict()
+
+    def __evict(self) -> None:
+        # Removes the least recently used entries beyond the limit. Another
+        # process may be evicting at the same time, so entries may vanish.
+        entries = list()
+        for entry in os.scandir(self.__directory):
+            if entry.name.startswith("tmp"):  # Being stored (see tempfile.mkstemp), never a key
+                continue
+            try:
+                entries.append((entry.stat().st_mtime, entry.path))
+            except FileNotFoundError:
+                continue
+        entries.sort()
+        for _, entry_path in entries[:max(0, len(entries) - self.__max_entries)]:
+            try:
+                os.remove(entry_path)
+            except FileNotFoundError:
+                continue
@@ -0,0 +1,87 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import contextlib
+import json
+import time
+import tracemalloc
+import typing
+
+
+class AssemblyStats:
+    """Records how long each phase of an assembly takes and how much memory it
+    allocates at its peak, along with counts that describe the program (lines,
+    instructions, symbols). Allocations are traced with tracemalloc, which
+    slows the run down, so the times are only comparable with other runs that
+    collect statistics.
+    """
+
+    def __init__(self, name: str) -> None:
+        """
+        Args:
+            name (str): the name of the assembled file, used in the report.
+        """
+        self.name = name
+        self.phases: typing.Dict[str, typing.Tuple[float, int]] = dict()
+        self.counts: typing.Dict[str, int] = dict()
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> typing.Iterator[None]:
+        """Measures the code run inside the context as a single phase.
+
+        Args:
+            name (str): the name of the phase.
+        """
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            if started_tracing:
+                tracemalloc.stop()
+            self.phases[name] = (elapsed, max(peak - baseline, 0))
+
+    def total_seconds(self) -> float:
+        """
+        Returns:
+            float: the time of all the phases together.
+        """
+        return sum(elapsed for elapsed, _ in self.phases.values())
+
+    def to_json(self) -> str:
+        """
+        Returns:
+            str: the statistics as a single line of JSON.
+        """
+        lines_per_second = self.counts.get("lines", 0) / self.total_seconds() if self.total_seconds() else 0.0
+        return json.dumps({
+            "file": self.name,
+            "phases": {name: {"seconds": round(elapsed, 6), "peak_bytes": peak}
+                       for name, (elapsed, peak) in self.phases.items()},
+            "counts": self.counts,
+            "total_seconds": round(self.total_seconds(), 6),
+            "lines_per_second": round(lines_per_second),
+        })
+
+    def table(self) -> str:
+        """
+        Returns:
+            str: the statistics as a human readable table.
+        """
+        rows = ["{}".format(self.name),
+                "  {:<12} {:>12} {:>14}".format("phase", "ms", "peak KiB")]
+        for name, (elapsed, peak) in self.phases.items():
+            rows.append("  {:<12} {:>12.3f} {:>14.1f}".format(name, elapsed * 1000, peak / 1024))
+        rows.append("  {:<12} {:>12.3f}".format("total", self.total_seconds() * 1000))
+        rows.append("  " + ", ".join("{} {}".format(name, count) for name, count in self.counts.items()))
+        return "\n".join(rows)
@@ -0,0 +1,267 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import gc
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import typing
+from Main import assemble_file
+
+# The programs of project 4, assembled as they are.
+FIXTURES_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "project 4")
+FIXTURES = ("mult/Mult.asm", "fill/Fill.asm", "swap/Swap.asm")
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+DEFAULT_SEED = 2017
+DEFAULT_LABEL_DENSITY = 0.05
+DEFAULT_VARIABLE_DENSITY = 0.1
+DEFAULT_THRESHOLD = 0.2
+# The baseline committed next to this script, recorded with the default
+# options. Timings depend on the machine, so a baseline recorded elsewhere
+# should be refreshed with --save-baseline before comparing against it.
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+
+# Straight-line sequences in the style of the VM translator's output. "{X}" is
+# replaced by a random symbol or constant.
+SNIPPETS = (
+    ("@{X}", "D=A", "@SP", "AM=M+1", "A=A-1", "M=D"),
+    ("@SP", "AM=M-1", "D=M", "@{X}", "M=D"),
+    ("@{X}", "D=M", "@SP", "AM=M+1", "A=A-1", "M=D"),
+    ("@SP", "AM=M-1", "D=M", "A=A-1", "M=M+D"),
+    ("@SP", "AM=M-1", "D=M", "A=A-1", "M=M-D"),
+    ("@{X}", "D=M", "@{X}", "D=D-A"),
+    ("@{X}", "M=M+1"),
+    ("@{X}", "M=0"),
+)
+PREDEFINED = ("SP", "LCL", "ARG", "THIS", "THAT", "R13", "R14", "R15", "SCREEN", "KBD")
+# Distinct variables never exceed the RAM below the screen.
+MAX_VARIABLES = 16384 - 16
+
+
+def generate_program(size: int, seed: int = DEFAULT_SEED, label_density: float = DEFAULT_LABEL_DENSITY,
+                     variable_density: float = DEFAULT_VARIABLE_DENSITY) -> str:
+    """Generates a random but valid assembly program. The same arguments
+    always generate the same program.
+
+    Args:
+        size (int): the approximate number of lines.
+        seed (int): the seed of the random generator.
+        label_density (float): the fraction of lines that declare a label.
+        variable_density (float): the fraction of symbolic A-instructions that
+            refer to a variable rather than to a label, a predefined symbol or
+            a constant.
+
+    Returns:
+        str: the program, including comments, indentation and blank lines.
+    """
+    generator = random.Random(seed)
+    label_count = max(1, int(size * label_density))
+    labels = ["Gen.label{}".format(index) for index in range(label_count)]
+    variables = ["Gen.{}".format(index) for index in range(max(1, min(MAX_VARIABLES, size // 20)))]
+    lines = ["// Generated benchmark program: {} lines, seed {}".format(size, seed)]
+    next_label = 0
+
+    def operand() -> str:
+        if generator.random() < variable_density:
+            return generator.choice(variables)
+        roll = generator.random()
+        if roll < 0.4:
+            return str(generator.randrange(32768))
+        if roll < 0.7:
+            return generator.choice(PREDEFINED)
+        return generator.choice(labels)
+
+    while len(lines) < size:
+        if next_label < label_count and generator.random() < label_density * 4:
+            lines.append("({})".format(labels[next_label]))
+            next_label += 1
+            continue
+        roll = generator.random()
+        if roll < 0.1:
+            lines.append("    @{}".format(generator.choice(labels)))
+            lines.append("    D;{}".format(generator.choice(("JEQ", "JNE", "JGT", "JLT", "JGE", "JLE"))))
+        elif roll < 0.15:
+            lines.append("")
+            lines.append("// {}".format(generator.choice(("push", "pop", "call", "return", "loop"))))
+        else:
+            for text in generator.choice(SNIPPETS):
+                if text == "@{X}":
+                    text = "@" + operand()
+                lines.append("    " + text + ("    // inline comment" if generator.random() < 0.05 else ""))
+    lines.extend("({})".format(label) for label in labels[next_label:])  # Every label must be declared
+    lines.append("(Gen.end)")
+    lines.append("    @Gen.end")
+    lines.append("    0;JMP")
+    return "\n".join(lines) + "\n"
+
+
+def measure(name: str, source: str, repeat: int = 3) -> typing.Dict[str, typing.Union[str, int, float]]:
+    """Assembles a program, from a file, several times.
+
+    Args:
+        name (str): the name of the program in the report.
+        source (str): the program.
+        repeat (int): how many timed runs to make. The fastest one counts.
+
+    Returns:
+        typing.Dict[str, typing.Union[str, int, float]]: the number of lines,
+        the best time, the lines per second and the peak memory (measured in
+        a separate run, since tracing allocations slows the assembler down).
+    """
+    descriptor, path = tempfile.mkstemp(suffix=".asm")
+    with os.fdopen(descriptor, 'w') as benchmark_file:
+        benchmark_file.write(source)
+    try:
+        best = float("inf")
+        for _ in range(repeat):
+            gc.collect()
+            with open(path, 'r') as input_file:
+                start = time.perf_counter()
+                assemble_file(input_file, io.StringIO())
+                best = min(best, time.perf_counter() - start)
+        gc.collect()
+        tracemalloc.start()
+        with open(path, 'r') as input_file:
+            assemble_file(input_file, io.StringIO())
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        os.remove(path)
+    lines = source.count("\n")
+    return {"name": name, "lines": lines, "seconds": round(best, 6),
+            "lines_per_second": round(lines / best) if best else 0, "peak_bytes": peak}
+
+
+def run_benchmarks(sizes: typing.Sequence[int] = DEFAULT_SIZES, seed: int = DEFAULT_SEED,
+                   label_density: float = DEFAULT_LABEL_DENSITY, variable_density: float = DEFAULT_VARIABLE_DENSITY,
+                   repeat: int = 3) -> typing.List[typing.Dict[str, typing.Union[str, int, float]]]:
+    """Measures the project 4 fixtures and a generated program of every size.
+
+    Args:
+        sizes (typing.Sequence[int]): the sizes (in lines) of the generated
+            programs.
+        seed (int): the seed of the generator.
+        label_density (float): see generate_program.
+        variable_density (float): see generate_program.
+        repeat (int): see measure.
+
+    Returns:
+        typing.List[typing.Dict[str, typing.Union[str, int, float]]]: the
+        results, one per program (see measure).
+    """
+    results = list()
+    for fixture in FIXTURES:
+        with open(os.path.join(FIXTURES_DIRECTORY, fixture), 'r') as fixture_file:
+            results.append(measure(os.path.basename(fixture), fixture_file.read(), repeat))
+    for size in sizes:
+        source = generate_program(size, seed, label_density, variable_density)
+        results.append(measure("generated-{}".format(size), source, repeat))
+    return results
+
+
+def compare(results: typing.List[typing.Dict[str, typing.Union[str, int, float]]],
+            baseline: typing.List[typing.Dict[str, typing.Union[str, int, float]]],
+            threshold: float = DEFAULT_THRESHOLD) -> typing.List[str]:
+    """Compares results against a baseline. A program regressed if its
+    throughput dropped, or its peak memory grew, by more than the threshold.
+
+    Args:
+        results (typing.List[typing.Dict[str, typing.Union[str, int, float]]]):
+            the current results.
+        baseline (typing.List[typing.Dict[str, typing.Union[str, int, float]]]):
+            results of an earlier run. Programs missing from it are skipped.
+        threshold (float): the allowed relative change, e.g. 0.2 for 20%.
+
+    Returns:
+        typing.List[str]: a description of every regression (empty if none).
+    """
+    baseline_by_name = {result["name"]: result for result in baseline}
+    regressions = list()
+    for result in results:
+        previous = baseline_by_name.get(result["name"])
+        if previous is None:
+            continue
+        if result["lines_per_second"] < previous["lines_per_second"] * (1 - threshold):
+            regressions.append("{}: {} lines/s, baseline {} lines/s".format(
+                result["name"], result["lines_per_second"], previous["lines_per_second"]))
+        if result["peak_bytes"] > previous["peak_bytes"] * (1 + threshold):
+            regressions.append("{}: peak {} bytes, baseline {} bytes".format(
+                result["name"], result["peak_bytes"], previous["peak_bytes"]))
+    return regressions
+
+
+def format_table(results: typing.List[typing.Dict[str, typing.Union[str, int, float]]]) -> str:
+    """
+    Args:
+        results (typing.List[typing.Dict[str, typing.Union[str, int, float]]]):
+            benchmark results.
+
+    Returns:
+        str: the results as a human readable table.
+    """
+    rows = ["{:<20} {:>10} {:>12} {:>14} {:>12}".format("program", "lines", "ms", "lines/s", "peak KiB")]
+    for result in results:
+        rows.append("{:<20} {:>10} {:>12.3f} {:>14} {:>12.1f}".format(
+            result["name"], result["lines"], result["seconds"] * 1000, result["lines_per_second"],
+            result["peak_bytes"] / 1024))
+    return "\n".join(rows)
+
+
+if "__main__" == __name__:
+    # Runs the benchmarks and prints the results.
+    # Options:
+    #   --sizes=N,N,...: sizes (in lines) of the generated programs.
+    #   --seed=N: seed of the program generator.
+    #   --label-density=F, --variable-density=F: see generate_program.
+    #   --repeat=N: timed runs per program (the fastest one counts).
+    #   --json: print the results as JSON instead of a table.
+    #   --save-baseline[=PATH]: store the results as a JSON baseline
+    #                           (benchmark_baseline.json next to this script
+    #                           if no path is given).
+    #   --baseline[=PATH]: compare against a stored baseline (the committed
+    #                      benchmark_baseline.json if no path is given), and
+    #                      exit with an error if any program regressed by more
+    #                      than the threshold.
+    #   --threshold=F: the allowed relative regression (default 0.2).
+    usage = "Invalid usage, please use: Benchmark.py [--sizes=N,...] [--seed=N] [--label-density=F] " \
+            "[--variable-density=F] [--repeat=N] [--json] [--save-baseline[=PATH]] [--baseline[=PATH]] [--threshold=F]"
+    options = dict(argument.partition("=")[::2] for argument in sys.argv[1:])
+    known_options = {"--sizes", "--seed", "--label-density", "--variable-density", "--repeat", "--json",
+                     "--save-baseline", "--baseline", "--threshold"}
+    if not options.keys() <= known_options:
+        sys.exit(usage)
+    try:
+        sizes = [int(size) for size in options["--sizes"].split(",")] if "--sizes" in options else DEFAULT_SIZES
+        seed = int(options.get("--seed", DEFAULT_SEED))
+        label_density = float(options.get("--label-density", DEFAULT_LABEL_DENSITY))
+        variable_density = float(options.get("--variable-density", DEFAULT_VARIABLE_DENSITY))
+        repeat = int(options.get("--repeat", 3))
+        threshold = float(options.get("--threshold", DEFAULT_THRESHOLD))
+    except ValueError:
+        sys.exit(usage)
+    if repeat < 1 or any(size < 1 for size in sizes):
+        sys.exit(usage)
+
+    benchmark_results = run_benchmarks(sizes, seed, label_density, variable_density, repeat)
+    print(json.dumps(benchmark_results, indent=2) if "--json" in options else format_table(benchmark_results))
+    if "--save-baseline" in options:
+        with open(options["--save-baseline"] or DEFAULT_BASELINE, 'w') as baseline_file:
+            json.dump(benchmark_results, baseline_file, indent=2)
+            baseline_file.write("\n")
+    if "--baseline" in options:
+        with open(options["--baseline"] or DEFAULT_BASELINE, 'r') as baseline_file:
+            found = compare(benchmark_results, json.load(baseline_file), threshold)
+        for regression in found:
+            print(regression, file=sys.stderr)
+        if found:
+            sys.exit("{} regressions above {:.0%}".format(len(found), threshold))
@@ -43,6 +43,60 @@ COMPUTATION_DICT = {
     "M>>": "011000000",
 }
 
+# The operands of commutative computations may be written in either order,
+# e.g. "M+D" is the same computation as "D+M".
+COMPUTATION_ALIASES = {
+    mnemonic[2] + mnemonic[1] + mnemonic[0]: mnemonic
+    for mnemonic in COMPUTATION_DICT
+    if len(mnemonic) == 3 and mnemonic[1] in "+&|" and mnemonic[0] != mnemonic[2]
+}
+
+JUMP_DICT = {
+    "": "000",
+    "JGT": "001",
+    "JEQ": "010",
+    "JGE": "011",
+    "JLT": "100",
+    "JNE": "101",
+    "JLE": "110",
+    "JMP": "111",
+}
+
+# Every spelling of every dest (the registers may be listed in any order).
+DEST_DICT = {
+    "": "000",
+    "M": "001", "D": "010", "A": "100",
+    "MD": "011", "DM": "011",
+    "AM": "101", "MA": "101",
+    "AD": "110", "DA": "110",
+    "AMD": "111", "ADM": "111", "MAD": "111", "MDA": "111", "DAM": "111", "DMA": "111",
+}
+
+
+def _build_c_instructions() -> dict:
+    """Precomputes the binary code of every valid C-instruction, keyed by its
+    text as it appears after white spaces and comments are removed, e.g.
+    "AM=M+1" or "D;JGT".
+    """
+    table = dict()
+    computations = dict(COMPUTATION_DICT)
+    for alias, mnemonic in COMPUTATION_ALIASES.items():
+        computations[alias] = COMPUTATION_DICT[mnemonic]
+    for dest, dest_code in DEST_DICT.items():
+        dest_text = dest + "=" if dest else ""
+        for comp, comp_code in computations.items():
+            for jump, jump_code in JUMP_DICT.items():
+                jump_text = ";" + jump if jump else ""
+                table[dest_text + comp + jump_text] = "1" + comp_code + dest_code + jump_code
+    return table
+
+
+# Instruction text -> 16-bit binary code.
+C_INSTRUCTIONS = _build_c_instructions()
+
+# Address -> 16-bit binary code, filled on first use.
+A_INSTRUCTIONS = dict()
+
 
 class Code:
     """Translates Hack assembly language mnemonics into binary codes."""
@@ -56,20 +110,7 @@ class Code:
         Returns:
             str: 3-bit long binary code of the given mnemonic.
         """
-        a_bit = '0'
-        d_bit = '0'
-        m_bit = '0'
-
-        for i in range(len(mnemonic)):
-            if mnemonic[i] == 'A':
-                a_bit = '1'
-            elif mnemonic[i] == 'D':
-                d_bit = '1'
-            elif mnemonic[i] == 'M':
-                m_bit = '1'
-
-        code = a_bit + d_bit + m_bit
-        return code
+        return DEST_DICT[mnemonic]
 
     @staticmethod
     def comp(mnemonic: str) -> str:
@@ -80,7 +121,7 @@ class Code:
         Returns:
             str: the binary code of the given mnemonic.
         """
-        return COMPUTATION_DICT[mnemonic]
+        return COMPUTATION_DICT[COMPUTATION_ALIASES.get(mnemonic, mnemonic)]
 
     @staticmethod
     def jump(mnemonic: str) -> str:
@@ -91,22 +132,45 @@ class Code:
         Returns:
             str: 3-bit long binary code of the given mnemonic.
         """
-        if mnemonic == "":
-            return "000"
-        elif mnemonic == "JGT":
-            return "001"
-        elif mnemonic == "JEQ":
-            return "010"
-        elif mnemonic == "JGE":
-            return "011"
-        elif mnemonic == "JLT":
-            return "100"
-        elif mnemonic == "JNE":
-            return "101"
-        elif mnemonic == "JLE":
-            return "110"
-        elif mnemonic == "JMP":
-            return "111"
+        return JUMP_DICT[mnemonic]
+
+    @staticmethod
+    def c_instruction(instruction: str) -> str:
+        """
+        Args:
+            instruction (str): a C-instruction without white spaces or
+            comments, e.g. "AM=M+1".
+
+        Returns:
+            str: the 16-bit binary code of the instruction.
+        """
+        code = C_INSTRUCTIONS.get(instruction)
+        if code is None:
+            # An unusual spelling (e.g. "D=M;" with an empty jump) is encoded
+            # field by field, and remembered as well:
+            dest, eq, rest = instruction.partition("=")
+            if not eq:  # Dest is empty
+                dest, rest = "", instruction
+            comp, _, jump = rest.partition(";")
+            code = "1" + Code.comp(comp) + Code.dest(dest) + Code.jump(jump)
+            C_INSTRUCTIONS[instruction] = code
+        return code
+
+    @staticmethod
+    def a_instruction(address: int) -> str:
+        """
+        Args:
+            address (int): the value loaded by an A-instruction.
+
+        Returns:
+            str: the 16-bit binary code of the instruction.
+        """
+        code = A_INSTRUCTIONS.get(address)
+        if code is None:
+            binary_rep: str = Code.convert_to_binary(str(address))
+            code = Code.get_padding(binary_rep) + binary_rep
+            A_INSTRUCTIONS[address] = code
+        return code
 
     @staticmethod
     def convert_to_binary(string: str) -> str:
@@ -0,0 +1,111 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import typing
+from Parser import Parser, Command
+
+# Jumps that are always taken because of their constant computation. JMP is
+# always taken, whatever the computation is.
+UNCONDITIONAL_JUMPS = {("0", "JEQ"), ("0", "JGE"), ("0", "JLE"),
+                       ("1", "JGT"), ("1", "JNE"), ("-1", "JLT"), ("-1", "JNE")}
+
+
+class DeadCodeEliminator:
+    """Removes the instructions that can never be executed, and the label
+    declarations that are never referenced.
+
+    The program is split into basic blocks (a block starts at a label and
+    ends after a jump). Starting from the block at address 0, a block is
+    reachable if the previous block can fall through into it, or if a
+    reachable block refers to one of its labels. Any reference counts, not
+    only direct jumps: this also covers return addresses that are pushed as
+    data and jumped to indirectly later (e.g. "A=M; 0;JMP").
+    If the program may jump to numeric ROM addresses (see
+    Parser.fixed_addresses), every block that starts below the highest of
+    them is kept, so that no such target moves.
+    """
+
+    def __init__(self) -> None:
+        self.removed = 0
+        self.removed_labels = 0
+
+    def optimize(self, commands: typing.Iterable[Command]) -> typing.List[Command]:
+        """
+        Args:
+            commands (typing.Iterable[Command]): the decoded program.
+
+        Returns:
+            typing.List[Command]: the program without its unreachable code.
+        """
+        commands = list(commands)
+        fixed = Parser.fixed_addresses(commands)
+        blocks = DeadCodeEliminator.__split_blocks(commands)
+        label_blocks: typing.Dict[str, int] = dict()
+        pending = [0] if blocks else []
+        address = 0
+        for index, block in enumerate(blocks):
+            if 0 < index and address < fixed:
+                pending.append(index)  # May be jumped to by address, and must not move anyway
+            for command in block:
+                if command.kind == "L_COMMAND":
+                    label_blocks.setdefault(command.symbol, index)  # Like first_pass, the first declaration wins
+                else:
+                    address += 1
+
+        reachable = set()
+        referenced_labels = set()
+        while pending:
+            index = pending.pop()
+            if index in reachable:
+                continue
+            reachable.add(index)
+            block = blocks[index]
+            for command in block:
+                if command.kind == "A_COMMAND" and command.symbol in label_blocks:
+                    referenced_labels.add(command.symbol)
+                    pending.append(label_blocks[command.symbol])
+            last = block[-1]
+            falls_through = not (last.kind == "C_COMMAND" and
+                                 (last.jump == "JMP" or (last.comp, last.jump) in UNCONDITIONAL_JUMPS))
+            if falls_through and index + 1 < len(blocks):
+                pending.append(index + 1)
+
+        optimized = list()
+        for index, block in enumerate(blocks):
+            if index not in reachable:
+                self.removed += sum(1 for command in block if command.kind != "L_COMMAND")
+                self.removed_labels += sum(1 for command in block if command.kind == "L_COMMAND")
+                continue
+            for command in block:
+                if command.kind == "L_COMMAND" and command.symbol not in referenced_labels:
+                    self.removed_labels += 1
+                    continue
+                optimized.append(command)
+        return optimized
+
+    @staticmethod
+    def __split_blocks(commands: typing.List[Command]) -> typing.List[typing.List[Command]]:
+        blocks = list()
+        block = list()
+        for command in commands:
+            if command.kind == "L_COMMAND" and block and block[-1].kind != "L_COMMAND":
+                blocks.append(block)
+                block = list()
+            block.append(command)
+            if command.kind == "C_COMMAND" and command.jump:
+                blocks.append(block)
+                block = list()
+        if block:
+            blocks.append(block)
+        return blocks
+
+    def report(self) -> str:
+        """
+        Returns:
+            str: how many words (and labels) were removed.
+        """
+        return "removed {} unreachable words and {} dead labels".format(self.removed, self.removed_labels)
@@ -0,0 +1,150 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import array
+import mmap
+import sys
+import typing
+
+PACKED_EXTENSION = ".hackbin"
+
+# Line of binary code -> word. Programs repeat the same instructions a lot.
+WORDS = dict()
+
+
+class PackedWriter:
+    """A write-only stream that accepts the same text the assembler writes to
+    a .hack file ("0101...\\n" lines), and packs it into a ROM image of
+    little-endian uint16 words (2 bytes per instruction instead of 17).
+    Like a text file, it supports tell() and seek(), so the streaming
+    assembler can patch instructions in place.
+    """
+
+    def __init__(self, output_file: typing.Optional[typing.BinaryIO] = None) -> None:
+        """
+        Args:
+            output_file (typing.Optional[typing.BinaryIO]): the packed words
+                are written here when flush() is called. If None, the words are
+                only kept in memory (see words()).
+        """
+        self.__output_file = output_file
+        self.__words = array.array('H')
+        self.__position = 0
+
+    def write(self, text: str) -> int:
+        """Packs the given lines of binary code.
+
+        Args:
+            text (str): one or more lines of 16 binary digits.
+
+        Returns:
+            int: the number of characters consumed.
+        """
+        for line in text.split():
+            word = WORDS.get(line)
+            if word is None:
+                word = int(line, 2)
+                WORDS[line] = word
+            if self.__position < len(self.__words):
+                self.__words[self.__position] = word
+            else:
+                self.__words.append(word)
+            self.__position += 1
+        return len(text)
+
+    def tell(self) -> int:
+        return self.__position
+
+    def seek(self, position: int) -> int:
+        self.__position = position
+        return position
+
+    def seekable(self) -> bool:
+        return True
+
+    def words(self) -> array.array:
+        """
+        Returns:
+            array.array: the words packed so far, in native byte order.
+        """
+        return self.__words
+
+    def flush(self) -> None:
+        """Writes all packed words to the output file as little-endian uint16."""
+        if self.__output_file is None:
+            return
+        write_words(self.__words, self.__output_file)
+
+
+def write_words(words: array.array, output_file: typing.BinaryIO) -> None:
+    """Writes a ROM image as little-endian uint16 words.
+
+    Args:
+        words (array.array): the instructions, an array of type 'H'.
+        output_file (typing.BinaryIO): a file opened for binary writing.
+    """
+    if sys.byteorder != "little":
+        words = array.array('H', words)
+        words.byteswap()
+    words.tofile(output_file)
+
+
+def load_packed(path: str) -> memoryview:
+    """Memory-maps a packed ROM image. On little-endian machines the returned
+    view shares the mapped pages, so no word is copied.
+
+    Args:
+        path (str): path of a .hackbin file.
+
+    Returns:
+        memoryview: the instructions, one uint16 per item.
+    """
+    with open(path, 'rb') as packed_file:
+        packed_file.seek(0, 2)
+        if packed_file.tell() == 0:  # mmap cannot map an empty file
+            return memoryview(array.array('H'))
+        mapped = mmap.mmap(packed_file.fileno(), 0, access=mmap.ACCESS_READ)
+    if sys.byteorder == "little":
+        return memoryview(mapped).cast('H')
+    words = array.array('H')
+    words.frombytes(mapped)
+    words.byteswap()
+    return memoryview(words)
+
+
+def load_text(path: str) -> array.array:
+    """Reads a .hack text file.
+
+    Args:
+        path (str): path of a .hack file.
+
+    Returns:
+        array.array: the instructions, an array of type 'H'.
+    """
+    with open(path, 'r') as text_file:
+        return array.array('H', (int(line, 2) for line in text_file.read().split()))
+
+
+def round_trips(text_path: str, packed_path: str) -> bool:
+    """Checks that a .hack file and a .hackbin file hold the same program.
+
+    Args:
+        text_path (str): path of a .hack file.
+        packed_path (str): path of a .hackbin file.
+
+    Returns:
+        bool: True if both files hold the exact same instructions.
+    """
+    return load_text(text_path).tobytes() == load_packed(packed_path).tobytes()
+
+
+if "__main__" == __name__:
+    # Compares a .hack file with its packed counterpart.
+    if not len(sys.argv) == 3:
+        sys.exit("Invalid usage, please use: HackBinary.py <.hack path> <.hackbin path>")
+    if not round_trips(sys.argv[1], sys.argv[2]):
+        sys.exit("Mismatch between {} and {}".format(sys.argv[1], sys.argv[2]))
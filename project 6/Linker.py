@@ -0,0 +1,163 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import array
+import json
+import os
+import sys
+import typing
+from HackBinary import write_words, PACKED_EXTENSION
+
+OBJECT_EXTENSION = ".hobj"
+OBJECT_VERSION = 1
+FIRST_VARIABLE_ADDRESS = 16
+
+
+class ObjectFile:
+    """A relocatable module: the code of a single .asm file, assembled as if
+    it started at ROM address 0.
+    """
+
+    def __init__(self, code: typing.List[int], labels: typing.Dict[str, int], relocations: typing.List[int],
+                 references: typing.Dict[str, typing.List[int]]) -> None:
+        """
+        Args:
+            code (typing.List[int]): the machine words of the module.
+            labels (typing.Dict[str, int]): the labels declared in the module
+                (all of them are exported), and their offset in the module.
+            relocations (typing.List[int]): indices of the words that hold the
+                offset of one of the module's labels, and must be moved by the
+                address the module is linked at.
+            references (typing.Dict[str, typing.List[int]]): symbols that are
+                not defined in the module, in order of first use, and the
+                indices of the words that refer to them. Each one is either a
+                label of another module or a variable that still needs a RAM
+                address; only the linker can tell.
+        """
+        self.code = code
+        self.labels = labels
+        self.relocations = relocations
+        self.references = references
+
+    def write(self, output_file: typing.TextIO) -> None:
+        """
+        Args:
+            output_file (typing.TextIO): writes the object file here.
+        """
+        json.dump({"version": OBJECT_VERSION, "code": self.code, "labels": self.labels,
+                   "relocations": self.relocations, "references": self.references}, output_file)
+
+    @staticmethod
+    def read(input_file: typing.TextIO) -> "ObjectFile":
+        """
+        Args:
+            input_file (typing.TextIO): an object file.
+
+        Returns:
+            ObjectFile: the module in the file.
+        """
+        content = json.load(input_file)
+        if content.get("version") != OBJECT_VERSION:
+            raise ValueError("Unsupported object file version: {}".format(content.get("version")))
+        return ObjectFile(content["code"], content["labels"], content["relocations"], content["references"])
+
+
+class Linker:
+    """Links relocatable modules into a single program. Modules are placed in
+    ROM in the order they are added, so the first one should hold the code
+    that runs at address 0 (e.g. the bootstrap code). References are resolved
+    across modules, and the symbols that no module declares as a label are
+    variables, which are allocated RAM addresses from 16 upward in order of
+    first use, exactly as if the modules were assembled as a single file.
+    """
+
+    def __init__(self) -> None:
+        self.__modules: typing.List[typing.Tuple[str, ObjectFile]] = list()
+
+    def add(self, name: str, module: ObjectFile) -> None:
+        """
+        Args:
+            name (str): the name of the module, used in error messages.
+            module (ObjectFile): the module to link.
+        """
+        self.__modules.append((name, module))
+
+    def link(self) -> typing.Tuple[array.array, typing.Dict[str, int]]:
+        """
+        Returns:
+            typing.Tuple[array.array, typing.Dict[str, int]]: the machine
+            words of the program (an array of type 'H'), and the address of
+            every label and variable.
+        """
+        symbols: typing.Dict[str, int] = dict()
+        declared_in: typing.Dict[str, str] = dict()
+        bases = list()
+        base = 0
+        for name, module in self.__modules:
+            bases.append(base)
+            for label, offset in module.labels.items():
+                if label in symbols:
+                    raise ValueError("Label {} is declared in both {} and {}".format(
+                        label, declared_in[label], name))
+                symbols[label] = base + offset
+                declared_in[label] = name
+            base += len(module.code)
+
+        words = array.array('H')
+        next_variable = FIRST_VARIABLE_ADDRESS
+        for (name, module), base in zip(self.__modules, bases):
+            start = len(words)
+            words.extend(module.code)
+            for index in module.relocations:
+                words[start + index] += base
+            for symbol, indices in module.references.items():
+                if symbol not in symbols:  # No module declares it - it's a variable
+                    symbols[symbol] = next_variable
+                    next_variable += 1
+                for index in indices:
+                    words[start + index] = symbols[symbol]
+        return words, symbols
+
+
+def link_paths(object_paths: typing.List[str], output_path: str) -> None:
+    """Links object files into a .hack file (or a .hackbin file, according to
+    the extension of the output path).
+
+    Args:
+        object_paths (typing.List[str]): the object files, in ROM order.
+        output_path (str): where to write the program.
+    """
+    linker = Linker()
+    for object_path in object_paths:
+        with open(object_path, 'r') as object_file:
+            linker.add(object_path, ObjectFile.read(object_file))
+    words, symbols = linker.link()
+    if os.path.splitext(output_path)[1].lower() == PACKED_EXTENSION:
+        with open(output_path, 'wb') as output_file:
+            write_words(words, output_file)
+    else:
+        with open(output_path, 'w') as output_file:
+            output_file.write("".join(format(word, '016b') + "\n" for word in words))
+
+
+if "__main__" == __name__:
+    # Links the given object files (or all the object files in the given
+    # directory, sorted by name) into a single program. The first object file
+    # is placed at ROM address 0.
+    if len(sys.argv) < 3:
+        sys.exit("Invalid usage, please use: Linker.py <output path> <object files or directory>")
+    paths_to_link = list()
+    for argument in sys.argv[2:]:
+        argument_path = os.path.abspath(argument)
+        if os.path.isdir(argument_path):
+            paths_to_link.extend(
+                os.path.join(argument_path, filename)
+                for filename in sorted(os.listdir(argument_path))
+                if os.path.splitext(filename)[1].lower() == OBJECT_EXTENSION)
+        else:
+            paths_to_link.append(argument_path)
+    link_paths(paths_to_link, os.path.abspath(sys.argv[1]))
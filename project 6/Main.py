@@ -5,84 +5,415 @@ was written by Aviv Yaish. It is an extension to the specifications given
 as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
 Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
+import array
+import concurrent.futures
+import io
 import os
 import sys
 import typing
 from SymbolTable import SymbolTable
-from Parser import Parser
+from Parser import Parser, Command
 from Code import Code
+from HackBinary import PackedWriter, PACKED_EXTENSION
+from AssemblyCache import AssemblyCache
+from PeepholeOptimizer import PeepholeOptimizer
+from DeadCodeEliminator import DeadCodeEliminator
+from Linker import ObjectFile, OBJECT_EXTENSION
+from SymbolMap import SymbolMap, MAP_EXTENSION
+from AssemblyStats import AssemblyStats
 
 A_CMD = "A_COMMAND"
 C_CMD = "C_COMMAND"
 L_CMD = "L_COMMAND"
 
 
-def assemble_file(input_file: typing.TextIO, output_file: typing.TextIO) -> None:
+def assemble_file(input_file: typing.TextIO, output_file: typing.TextIO,
+                  optimizers: typing.Sequence[typing.Union[DeadCodeEliminator, PeepholeOptimizer]] = (),
+                  map_file: typing.Optional[typing.TextIO] = None) -> None:
     """Assembles a single file.
 
     Args:
         input_file (typing.TextIO): the file to assemble.
         output_file (typing.TextIO): writes all output to this file.
+        optimizers (typing.Sequence[typing.Union[DeadCodeEliminator, PeepholeOptimizer]]):
+            passes that rewrite the program, in order, between parsing and
+            assigning addresses.
+        map_file (typing.Optional[typing.TextIO]): if given, writes the
+            program's SymbolMap here.
     """
     parser = Parser(input_file)  # Note - parser already removes all comments and white spaces
     symtable = SymbolTable()
+    for optimizer in optimizers:
+        parser.replace_commands(optimizer.optimize(parser.commands()))
 
     first_pass(parser, symtable)
     second_pass(parser, symtable, output_file)
+    if map_file is not None:
+        build_symbol_map(parser, symtable).write(map_file)
+
+
+def assemble_file_with_stats(input_file: typing.TextIO, output_file: typing.TextIO, stats: AssemblyStats,
+                             optimizers: typing.Sequence[typing.Union[DeadCodeEliminator, PeepholeOptimizer]] = ()
+                             ) -> None:
+    """Assembles a single file exactly like assemble_file, measuring every
+    phase on its own: reading the input, strip_lines (cleaning and decoding),
+    the optimizers, first_pass, second_pass (into memory) and writing the
+    output.
+
+    Args:
+        input_file (typing.TextIO): the file to assemble.
+        output_file (typing.TextIO): writes all output to this file.
+        stats (AssemblyStats): records the phases and the program counts.
+        optimizers (typing.Sequence[typing.Union[DeadCodeEliminator, PeepholeOptimizer]]):
+            passes that rewrite the program, in order.
+    """
+    with stats.phase("read"):
+        input_lines = input_file.readlines()
+    with stats.phase("strip_lines"):
+        parser = Parser(input_lines)
+    for optimizer in optimizers:
+        with stats.phase(type(optimizer).__name__):
+            parser.replace_commands(optimizer.optimize(parser.commands()))
+    symtable = SymbolTable()
+    with stats.phase("first_pass"):
+        first_pass(parser, symtable)
+
+    kinds = {A_CMD: 0, C_CMD: 0, L_CMD: 0}
+    variables = set()
+    for command in parser.commands():
+        kinds[command.kind] += 1
+        if command.kind == A_CMD and not command.symbol.isnumeric() and not symtable.contains(command.symbol):
+            variables.add(command.symbol)
+    labels = {command.symbol for command in parser.commands() if command.kind == L_CMD}
+    stats.counts.update(lines=len(input_lines), a_instructions=kinds[A_CMD], c_instructions=kinds[C_CMD],
+                        labels=kinds[L_CMD], symbols=len(labels) + len(variables), variables=len(variables))
+    del input_lines
+
+    output = io.StringIO()
+    with stats.phase("second_pass"):
+        second_pass(parser, symtable, output)
+    with stats.phase("write"):
+        output_file.write(output.getvalue())
+
+
+def build_symbol_map(parser: Parser, symtable: SymbolTable) -> SymbolMap:
+    """
+    Args:
+        parser (Parser): the parser of an assembled program.
+        symtable (SymbolTable): the program's final symbol table.
+
+    Returns:
+        SymbolMap: the labels, variables and source lines of the program.
+    """
+    predefined = SymbolTable()
+    symbol_map = SymbolMap()
+    next_address: int = 0
+    for command in parser.commands():
+        if command.kind == L_CMD:
+            if not predefined.contains(command.symbol):
+                symbol_map.labels[command.symbol] = symtable.get_address(command.symbol)
+            continue
+        if command.kind == A_CMD and not command.symbol.isnumeric() and not predefined.contains(command.symbol):
+            symbol_map.variables[command.symbol] = symtable.get_address(command.symbol)
+        symbol_map.add_line(next_address, command.line)
+        next_address += 1
+    for label in symbol_map.labels:  # Symbols that were referenced before their label was declared
+        symbol_map.variables.pop(label, None)
+    return symbol_map
+
+
+def assemble(source: typing.Union[str, typing.Iterable[str]]) -> typing.Tuple[array.array, SymbolTable]:
+    """Assembles a program held in memory, without any file I/O.
+
+    Args:
+        source (typing.Union[str, typing.Iterable[str]]): the program, either
+            as a single string or as an iterable of lines.
+
+    Returns:
+        typing.Tuple[array.array, SymbolTable]: the machine words of the
+        program (an array of type 'H'), and the final symbol table, holding
+        all predefined symbols, labels and variables.
+    """
+    if isinstance(source, str):
+        source = source.splitlines()
+    parser = Parser(source)
+    symtable = SymbolTable()
+    output = PackedWriter()
+
+    first_pass(parser, symtable)
+    second_pass(parser, symtable, output)
+    return output.words(), symtable
+
+
+def assemble_object(input_file: typing.TextIO, output_file: typing.TextIO,
+                    optimizers: typing.Sequence[PeepholeOptimizer] = ()) -> None:
+    """Assembles a single file into a relocatable object file, to be linked
+    with other modules later (see Linker).
+
+    Args:
+        input_file (typing.TextIO): the file to assemble.
+        output_file (typing.TextIO): writes the object file here.
+        optimizers (typing.Sequence[PeepholeOptimizer]): passes that rewrite
+            the module, in order, before it is assembled.
+    """
+    parser = Parser(input_file)
+    for optimizer in optimizers:
+        parser.replace_commands(optimizer.optimize(parser.commands()))
+    predefined = SymbolTable()
+    labels: typing.Dict[str, int] = dict()
+    next_address: int = 0
+    for command in parser.commands():
+        if command.kind == L_CMD:
+            if not predefined.contains(command.symbol) and command.symbol not in labels:
+                labels[command.symbol] = next_address
+        else:
+            next_address += 1
+
+    code = PackedWriter()
+    relocations: typing.List[int] = list()
+    references: typing.Dict[str, typing.List[int]] = dict()
+    for command in parser.commands():
+        if command.kind == A_CMD:
+            post_at = command.symbol
+            if post_at.isnumeric():
+                write_address(code, int(post_at))
+            elif predefined.contains(post_at):
+                write_address(code, predefined.get_address(post_at))
+            elif post_at in labels:  # Offset in this module - moved by the linker
+                relocations.append(code.tell())
+                write_address(code, labels[post_at])
+            else:  # Label of another module, or a variable - resolved by the linker
+                references.setdefault(post_at, list()).append(code.tell())
+                write_address(code, 0)
+        elif command.kind == C_CMD:
+            write_c_command(command, code)
+    ObjectFile(code.words().tolist(), labels, relocations, references).write(output_file)
+
+
+def assemble_file_streaming(input_file: typing.TextIO, output_file: typing.TextIO, mapped: bool = False) -> None:
+    """Assembles a single file in one pass, reading the input line by line.
+    Every instruction is written as soon as it is read. A-instructions that
+    refer to a symbol which is not yet known (a forward label reference or a
+    variable) are written as a placeholder, and their position in the output
+    is kept in a fixup table. When the input is exhausted, only those
+    placeholders are patched, so memory is bounded by the number of unresolved
+    references rather than by the size of the program.
+
+    Args:
+        input_file (typing.TextIO): the file to assemble.
+        output_file (typing.TextIO): writes all output to this file. Must be
+            seekable, since unresolved slots are patched in place.
+        mapped (bool): if True, the input file is memory-mapped and scanned
+            as bytes (see Parser.scan_mapped), so not even a single line of
+            it is decoded as a whole. Together with streaming, memory is then
+            bounded by the unresolved references, even for huge inputs.
+    """
+    parser = Parser(input_file, streaming=True, mapped=mapped)
+    symtable = SymbolTable()
+    fixups: dict[str, list[int]] = dict()  # symbol -> output positions waiting for its address
+    next_address: int = 0
+    for command in parser.commands():
+        command_type = command.kind
+        if command_type == A_CMD:
+            post_at = command.symbol
+            if post_at.isnumeric():  # The command uses a decimal number and not a symbol.
+                write_address(output_file, int(post_at))
+            elif symtable.contains(post_at):  # Predefined symbol or an already declared label
+                write_address(output_file, symtable.get_address(post_at))
+            else:  # Forward reference - leave a placeholder and patch it later:
+                fixups.setdefault(post_at, list()).append(output_file.tell())
+                write_address(output_file, 0)
+            next_address += 1
+
+        elif command_type == C_CMD:
+            write_c_command(command, output_file)
+            next_address += 1
+
+        elif command_type == L_CMD:
+            if not symtable.contains(command.symbol):
+                symtable.add_entry(command.symbol, next_address)
+
+    # Symbols that never got a label declaration are variables. They are
+    # allocated in order of first use, exactly like second_pass does.
+    end_position: int = output_file.tell()
+    symbol_address: int = 16
+    for symbol, positions in fixups.items():
+        if not symtable.contains(symbol):
+            symtable.add_entry(symbol, symbol_address)
+            symbol_address += 1
+        address: int = symtable.get_address(symbol)
+        for position in positions:
+            output_file.seek(position)
+            write_address(output_file, address)
+    output_file.seek(end_position)
+
+
+def write_address(output_file: typing.TextIO, address: int) -> None:
+    """Writes the binary code of an A-instruction holding the given address.
+
+    Args:
+        output_file (typing.TextIO): writes the instruction to this file.
+        address (int): the value loaded by the A-instruction.
+    """
+    output_file.write(Code.a_instruction(address) + "\n")
+
+
+def write_c_command(command: Command, output_file: typing.TextIO) -> None:
+    """Writes the binary code of a C-instruction.
+
+    Args:
+        command (Command): a decoded C-instruction.
+        output_file (typing.TextIO): writes the instruction to this file.
+    """
+    output_file.write(Code.c_instruction(command.text) + "\n")
 
 
 def first_pass(parser: Parser, symtable: SymbolTable) -> None:
     next_address: int = 0
     # FIRST PASS - log all label declarations into symtable:
-    while True:
-        command_type = parser.command_type()
+    for command in parser.commands():
+        command_type = command.kind
 
         if command_type == A_CMD or command_type == C_CMD:
             next_address += 1
         elif command_type == L_CMD:
-            symbol: str = parser.symbol()
+            symbol: str = command.symbol
             if not symtable.contains(symbol):
                 symtable.add_entry(symbol, next_address)
 
-        if not parser.has_more_commands():
-            break
-        parser.advance()
-
-    parser.reset()
-
 
 def second_pass(parser: Parser, symtable: SymbolTable, output_file: typing.TextIO) -> None:
     symbol_address: int = 16
-    while True:
-        # Check current line command type:
-        command_type = parser.command_type()
+    for command in parser.commands():
+        # Check current command type:
+        command_type = command.kind
         if command_type == A_CMD:
-            post_at = parser.symbol()
+            post_at = command.symbol
             if post_at.isnumeric():  # The command uses a decimal number and not a symbol.
-                binary_rep: str = Code.convert_to_binary(post_at)
-                output_file.write(Code.get_padding(binary_rep) + binary_rep + "\n")
+                write_address(output_file, int(post_at))
             else:  # The command uses a symbol.
                 if symtable.contains(post_at):  # The command uses a pre-existing symbol
-                    pre_existing_address: str = str(symtable.get_address(post_at))
-                    binary_rep: str = Code.convert_to_binary(pre_existing_address)
-                    output_file.write(Code.get_padding(binary_rep) + binary_rep + "\n")
+                    write_address(output_file, symtable.get_address(post_at))
                 else:  # The command is not a pre-existing symbol. Add to symtable and write binary command:
                     symtable.add_entry(post_at, symbol_address)
-                    binary_rep = Code.convert_to_binary(str(symbol_address))
-                    output_file.write(Code.get_padding(binary_rep) + binary_rep + "\n")
+                    write_address(output_file, symbol_address)
                     symbol_address += 1
 
         elif command_type == C_CMD:
-            dest: str = Code.dest(parser.dest())
-            comp: str = Code.comp(parser.comp())
-            jump: str = Code.jump(parser.jump())
-            c_instruction_prefix: str = "1"
-            output: str = c_instruction_prefix + comp + dest + jump + "\n"
-            output_file.write(output)
+            write_c_command(command, output_file)
+
 
-        if not parser.has_more_commands():
-            break
-        parser.advance()
+def assemble_path(input_path: str, streaming: bool = False, packed: bool = False, cache: bool = False,
+                  optimize: bool = False, dead_code: bool = False, relocatable: bool = False,
+                  symbol_map: bool = False, stats: typing.Optional[str] = None, mapped: bool = False) -> str:
+    """Assembles the .asm file in the given path into a .hack file (or a
+    .hackbin file) next to it.
+
+    Args:
+        input_path (str): path of the file to assemble.
+        streaming (bool): if True, uses assemble_file_streaming.
+        packed (bool): if True, writes a packed ROM image instead of text.
+        cache (bool): if True, files that were already assembled (same
+            content, same assembler) are restored from the on-disk cache
+            instead of being assembled again.
+        optimize (bool): if True, runs the peephole optimizer and prints how
+            many instructions it removed. Cannot be combined with streaming.
+        dead_code (bool): if True, removes unreachable code and prints how
+            many words were saved. Cannot be combined with streaming.
+        relocatable (bool): if True, writes a relocatable object file
+            (.hobj) instead, to be linked later. Cannot be combined with
+            streaming, packed or dead_code.
+        symbol_map (bool): if True, also writes a SymbolMap (.map) next to
+            the output. Cannot be combined with streaming or relocatable, and
+            bypasses the cache.
+        stats (typing.Optional[str]): if "table" or "json", prints the time
+            and peak memory of every phase (see AssemblyStats) in that format.
+            Cannot be combined with streaming, relocatable or symbol_map, and
+            bypasses the cache.
+        mapped (bool): if True, memory-maps the input file instead of
+            reading it. Requires streaming.
+
+    Returns:
+        str: the path of the output file.
+    """
+    filename, extension = os.path.splitext(input_path)
+    output_extension = OBJECT_EXTENSION if relocatable else PACKED_EXTENSION if packed else ".hack"
+    output_path = filename + output_extension
+    cache = cache and not symbol_map and not stats  # The map and the statistics are not cached
+    if cache:
+        assembly_cache = AssemblyCache(os.path.dirname(output_path))
+        output_format = output_extension + ("+dead-code" if dead_code else "") + ("+peephole" if optimize else "")
+        cache_key = assembly_cache.key(input_path, output_format)
+        if assembly_cache.restore(cache_key, output_path):
+            return output_path
+    with open(input_path, 'r') as input_file, \
+            open(output_path, 'wb' if packed else 'w') as output_file:
+        if packed:
+            output_file = PackedWriter(output_file)
+        optimizers = list()
+        if dead_code:
+            optimizers.append(DeadCodeEliminator())
+        if optimize:
+            optimizers.append(PeepholeOptimizer())
+        if streaming:
+            assemble_file_streaming(input_file, output_file, mapped)
+        elif relocatable:
+            assemble_object(input_file, output_file, optimizers)
+        elif stats:
+            assembly_stats = AssemblyStats(input_path)
+            assemble_file_with_stats(input_file, output_file, assembly_stats, optimizers)
+            print(assembly_stats.to_json() if stats == "json" else assembly_stats.table())
+        elif symbol_map:
+            with open(filename + MAP_EXTENSION, 'w') as map_file:
+                assemble_file(input_file, output_file, optimizers, map_file)
+        else:
+            assemble_file(input_file, output_file, optimizers)
+        output_file.flush()
+    for optimizer in optimizers:
+        print("{}: {}".format(input_path, optimizer.report()))
+    if cache:
+        assembly_cache.store(cache_key, output_path)
+    return output_path
+
+
+def assemble_paths_parallel(input_paths: typing.List[str], jobs: typing.Optional[int], streaming: bool = False,
+                            packed: bool = False, cache: bool = False, optimize: bool = False,
+                            dead_code: bool = False, relocatable: bool = False,
+                            symbol_map: bool = False, stats: typing.Optional[str] = None,
+                            mapped: bool = False) -> typing.Dict[str, str]:
+    """Assembles independent .asm files in a pool of worker processes. Each
+    file is assembled exactly like assemble_path does, so the outputs are
+    identical to a serial run.
+
+    Args:
+        input_paths (typing.List[str]): paths of the files to assemble.
+        jobs (typing.Optional[int]): number of worker processes, or None to
+            use one per CPU.
+        streaming (bool): if True, uses assemble_file_streaming.
+        packed (bool): if True, writes packed ROM images instead of text.
+        cache (bool): if True, uses the on-disk cache (see assemble_path).
+        optimize (bool): if True, runs the peephole optimizer.
+        dead_code (bool): if True, removes unreachable code.
+        relocatable (bool): if True, writes relocatable object files instead.
+        symbol_map (bool): if True, also writes a symbol map for every file.
+        stats (typing.Optional[str]): if given, prints the statistics of every
+            file in this format ("table" or "json").
+        mapped (bool): if True, memory-maps the input files.
+
+    Returns:
+        typing.Dict[str, str]: an error message for every input path that
+        failed to assemble (empty if all succeeded).
+    """
+    errors = dict()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {executor.submit(assemble_path, input_path, streaming, packed, cache, optimize, dead_code,
+                                   relocatable, symbol_map, stats, mapped): input_path
+                   for input_path in input_paths}
+        for future in concurrent.futures.as_completed(futures):
+            error = future.exception()
+            if error is not None:
+                errors[futures[future]] = "{}: {}".format(type(error).__name__, error)
+    return errors
 
 
 if "__main__" == __name__:
@@ -91,20 +422,75 @@ if "__main__" == __name__:
     # Both are closed automatically when the code finishes running.
     # If the output file does not exist, it is created automatically in the
     # correct path, using the correct filename.
-    if not len(sys.argv) == 2:
-        sys.exit("Invalid usage, please use: Assembler <input path>")
-    argument_path = os.path.abspath(sys.argv[1])
+    # Options:
+    #   --stream: assemble each file in a single streaming pass.
+    #   --packed: write a packed ROM image (.hackbin) instead of .hack text.
+    #   --jobs[=N]: assemble the files of a directory in N worker processes
+    #               (one per CPU if N is not given).
+    #   --cache: skip files whose content did not change since they were last
+    #            assembled, restoring their output from the cache (a
+    #            .asm_cache directory next to the outputs, which may be
+    #            deleted to clear it).
+    #   --optimize: run the peephole optimizer (not with --stream).
+    #   --dead-code: remove unreachable code (not with --stream).
+    #   --object: write a relocatable object file (.hobj) per input, to be
+    #             linked with Linker.py (not with --stream, --packed or
+    #             --dead-code).
+    #   --map: also write a .map file with the address of every label and
+    #          variable, and the source line of every instruction (not with
+    #          --stream or --object).
+    #   --stats[=table|json]: print the time and peak memory of every phase,
+    #                         and counts of lines, instructions and symbols
+    #                         (not with --stream, --object or --map).
+    #   --mmap: memory-map the input files and scan them as bytes, instead of
+    #           reading them as text, so memory stays bounded even for huge
+    #           inputs (only with --stream).
+    usage = "Invalid usage, please use: Assembler [--stream] [--packed] [--jobs[=N]] [--cache] [--optimize] " \
+            "[--dead-code] [--object] [--map] [--stats[=table|json]] [--mmap] <input path>"
+    arguments = [argument for argument in sys.argv[1:] if not argument.startswith("--")]
+    options = dict(argument.partition("=")[::2] for argument in sys.argv[1:] if argument.startswith("--"))
+    known_options = {"--stream", "--packed", "--jobs", "--cache", "--optimize", "--dead-code", "--object",
+                     "--map", "--stats", "--mmap"}
+    if not len(arguments) == 1 or not options.keys() <= known_options:
+        sys.exit(usage)
+    streaming = "--stream" in options
+    packed = "--packed" in options
+    parallel = "--jobs" in options
+    cache = "--cache" in options
+    optimize = "--optimize" in options
+    dead_code = "--dead-code" in options
+    relocatable = "--object" in options
+    symbol_map = "--map" in options
+    stats = (options["--stats"] or "table") if "--stats" in options else None
+    mapped = "--mmap" in options
+    if stats not in (None, "table", "json"):
+        sys.exit(usage)
+    if streaming and (optimize or dead_code or relocatable or symbol_map or stats) or \
+            relocatable and (packed or dead_code or symbol_map or stats) or \
+            stats and symbol_map or mapped and not streaming:
+        sys.exit(usage)
+    jobs = None
+    if options.get("--jobs"):
+        if not options["--jobs"].isnumeric() or int(options["--jobs"]) < 1:
+            sys.exit(usage)
+        jobs = int(options["--jobs"])
+    argument_path = os.path.abspath(arguments[0])
     if os.path.isdir(argument_path):
         files_to_assemble = [
             os.path.join(argument_path, filename)
             for filename in os.listdir(argument_path)]
     else:
         files_to_assemble = [argument_path]
-    for input_path in files_to_assemble:
-        filename, extension = os.path.splitext(input_path)
-        if extension.lower() != ".asm":
-            continue
-        output_path = filename + ".hack"
-        with open(input_path, 'r') as input_file, \
-                open(output_path, 'w') as output_file:
-            assemble_file(input_file, output_file)
+    files_to_assemble = [input_path for input_path in files_to_assemble
+                         if os.path.splitext(input_path)[1].lower() == ".asm"]
+    if parallel:
+        failures = assemble_paths_parallel(files_to_assemble, jobs, streaming, packed, cache, optimize,
+                                           dead_code, relocatable, symbol_map, stats, mapped)
+        for input_path in sorted(failures):
+            print("{}: {}".format(input_path, failures[input_path]), file=sys.stderr)
+        if failures:
+            sys.exit("{} of {} files failed to assemble".format(len(failures), len(files_to_assemble)))
+    else:
+        for input_path in files_to_assemble:
+            assemble_path(input_path, streaming, packed, cache, optimize, dead_code, relocatable, symbol_map,
+                          stats, mapped)
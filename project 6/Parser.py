@@ -5,7 +5,43 @@ was written by Aviv Yaish. It is an extension to the specifications given
 as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
 Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
+import itertools
+import mmap
+import os
 import typing
+from SymbolTable import SymbolTable
+
+# First bytes of the commands that hold a symbol ("@" and "(").
+SYMBOL_PREFIXES = frozenset(b"@(")
+
+
+class Command:
+    """A single decoded assembly command. Every line of the input is decoded
+    into a Command exactly once, so the assembler passes never have to split
+    the raw text again.
+    """
+    __slots__ = ("kind", "text", "symbol", "dest", "comp", "jump", "line")
+
+    def __init__(self, kind: str, text: str, symbol: str = "", dest: str = "", comp: str = "",
+                 jump: str = "", line: int = 0) -> None:
+        """
+        Args:
+            kind (str): "A_COMMAND", "C_COMMAND" or "L_COMMAND".
+            text (str): the command as written, without white spaces or comments.
+            symbol (str): the symbol or decimal Xxx of @Xxx or (Xxx).
+            dest (str): the dest mnemonic of a C-command.
+            comp (str): the comp mnemonic of a C-command.
+            jump (str): the jump mnemonic of a C-command.
+            line (int): the number of the source line the command was read
+                from (starting from 1), or 0 if it was not read from a source.
+        """
+        self.kind = kind
+        self.text = text
+        self.symbol = symbol
+        self.dest = dest
+        self.comp = comp
+        self.jump = jump
+        self.line = line
 
 
 class Parser:
@@ -15,25 +51,186 @@ class Parser:
     and symbols). In addition, removes all white space and comments.
     """
 
-    def __init__(self, input_file: typing.TextIO) -> None:
+    def __init__(self, input_file: typing.Iterable[str], streaming: bool = False, mapped: bool = False) -> None:
         """Opens the input file and gets ready to parse it.
 
         Args:
-            input_file (typing.TextIO): input file.
+            input_file (typing.Iterable[str]): input file, or any other
+                iterable of lines (e.g. a list of strings).
+            streaming (bool): if True, lines are pulled from the input one at a
+                time instead of being loaded up front. A streaming parser can
+                only be walked once (reset() is not supported).
+            mapped (bool): if True, the input must be a real file, which is
+                memory-mapped and scanned as bytes (see scan_mapped) instead
+                of being read line by line. Only a streaming parser can be
+                mapped: a parser that keeps every command gains nothing from
+                not reading the file.
         """
+        if mapped and not streaming:
+            raise ValueError("Only a streaming parser can be mapped")
+        self.__streaming = streaming
+        if streaming:
+            lines = Parser.scan_mapped(input_file) if mapped else Parser.clean_lines(input_file)
+            self.__commands_stream = itertools.starmap(Parser.decode, lines)
+            self.__cur_command: Command = next(self.__commands_stream)
+            self.__next_command = next(self.__commands_stream, None)
+            return
+
         self.__input_lines = list()
         self.strip_lines(input_file)
+        self.__commands: list[Command] = [Parser.decode(line, number) for line, number in self.__input_lines]
+        self.__input_lines = list()  # The raw lines are no longer needed
 
-        self.__lines_index = 0
-        self.__cur_line: str = self.__input_lines[self.__lines_index]
+        self.__commands_index = 0
+        self.__cur_command: Command = self.__commands[self.__commands_index]
+
+    @staticmethod
+    def clean_lines(input_file: typing.Iterable[str]) -> typing.Iterator[typing.Tuple[str, int]]:
+        """Lazily reads the input file, yielding one command per line with all
+        white spaces and comments removed. Empty lines are skipped.
+
+        Args:
+            input_file (typing.Iterable[str]): input file or lines.
 
-    def strip_lines(self, input_file: typing.TextIO) -> None:
-        lines_raw: list[str] = input_file.read().strip().splitlines()
-        for line in lines_raw:
+        Yields:
+            typing.Tuple[str, int]: the next command in the file, and the
+            number of the line it was read from (starting from 1).
+        """
+        for line_number, line in enumerate(input_file, 1):
             cur_line = "".join(line.split())
             cur_line = cur_line.split("//")[0]  # get rid of comments
             if len(cur_line) > 0:  # In case line is just a comment or white-spaces
-                self.__input_lines.append(cur_line)
+                yield cur_line, line_number
+
+    @staticmethod
+    def scan_mapped(input_file: typing.IO) -> typing.Iterator[typing.Tuple[str, int]]:
+        """Yields the same commands as clean_lines, but memory-maps the file and
+        scans it as bytes. The file is never read or decoded as a whole: each
+        line is sliced out of the mapping into a short-lived bytes object, and
+        its comment and white spaces are cut off as bytes. C-instructions come
+        from a small set, so each distinct one is decoded only once and shared;
+        A-instructions and labels are decoded as they come, so memory does not
+        grow with the number of distinct symbols.
+
+        Args:
+            input_file (typing.IO): an open file (text or binary).
+
+        Yields:
+            typing.Tuple[str, int]: the next command in the file, and the
+            number of the line it was read from (starting from 1).
+        """
+        if os.fstat(input_file.fileno()).st_size == 0:  # mmap cannot map an empty file
+            return
+        texts: typing.Dict[bytes, str] = dict()
+        with mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for line_number, line in enumerate(iter(mapped.readline, b""), 1):
+                raw = line.partition(b"//")[0].strip()
+                if not raw:
+                    continue
+                if raw[0] in SYMBOL_PREFIXES:  # Symbols are decoded as they come, so memory is not tied to them
+                    yield "".join(raw.decode().split()), line_number
+                    continue
+                text = texts.get(raw)
+                if text is None:
+                    text = "".join(raw.decode().split())  # White spaces inside the command, e.g. "D = M"
+                    texts[raw] = text
+                yield text, line_number
+
+    def strip_lines(self, input_file: typing.Iterable[str]) -> None:
+        self.__input_lines.extend(Parser.clean_lines(input_file))
+
+    @staticmethod
+    def decode(line: str, line_number: int = 0) -> Command:
+        """Decodes a single clean line (no white spaces or comments).
+
+        Args:
+            line (str): the command to decode.
+            line_number (int): the number of the source line.
+
+        Returns:
+            Command: the decoded command.
+        """
+        # Read the first character in the command.
+        # If '@' - A-command, if '(' - L-command, else: C-command
+        first_char = line[0]
+        if first_char == '@':
+            return Command("A_COMMAND", line, symbol=line[1:], line=line_number)
+        elif first_char == '(':
+            return Command("L_COMMAND", line, symbol=line[1:-1], line=line_number)
+
+        dest, eq, rest = line.partition("=")
+        if not eq:  # Dest is empty
+            dest, rest = "", line
+        comp, _, jump = rest.partition(";")
+        return Command("C_COMMAND", line, dest=dest, comp=comp, jump=jump, line=line_number)
+
+    @staticmethod
+    def fixed_addresses(commands: typing.Sequence[Command]) -> int:
+        """Finds how much of the start of the program must keep its addresses.
+        A program may jump to a ROM address that is not a label: a number or
+        a predefined symbol (e.g. "@7" or "@R3") whose value is used, not only
+        the memory it addresses. The value may go through D or RAM before it
+        is jumped to (e.g. "@7", "D=A", "@R13", "M=D", "@R13", "A=M", "0;JMP"),
+        so any use of it counts. A is followed across labels too, since they
+        may be reached by falling through. Values past the end of the program
+        are not ROM addresses.
+
+        Args:
+            commands (typing.Sequence[Command]): the decoded program.
+
+        Returns:
+            int: one more than the highest ROM address that the program may
+            jump to without a label (0 if there is none). Adding or removing
+            instructions is safe only from this address on.
+        """
+        predefined = SymbolTable()
+        size = sum(1 for command in commands if command.kind != "L_COMMAND")
+        fixed = 0
+        value: typing.Optional[int] = None  # The value of A, if it was loaded as a number or a predefined symbol
+        for command in commands:
+            if command.kind == "A_COMMAND":
+                if command.symbol.isnumeric():
+                    value = int(command.symbol)
+                elif predefined.contains(command.symbol):
+                    value = predefined.get_address(command.symbol)
+                else:
+                    value = None
+            elif command.kind == "C_COMMAND":
+                if value is not None and value < size and ("A" in command.comp or command.jump):
+                    fixed = max(fixed, value + 1)
+                if "A" in command.dest:
+                    value = None
+        return fixed
+
+    def commands(self) -> typing.Iterator[Command]:
+        """Iterates over all the decoded commands, from the first one.
+        On a streaming parser this can only be done once.
+
+        Returns:
+            typing.Iterator[Command]: the decoded commands of the program.
+        """
+        if not self.__streaming:
+            return iter(self.__commands)
+        return self.__stream_commands()
+
+    def replace_commands(self, commands: typing.List[Command]) -> None:
+        """Replaces the decoded program, e.g. with an optimized version of it,
+        and resets the parser to its first command. Not supported by streaming
+        parsers.
+
+        Args:
+            commands (typing.List[Command]): the new program.
+        """
+        if self.__streaming:
+            raise ValueError("A streaming parser cannot be modified")
+        self.__commands = commands
+        self.reset()
+
+    def __stream_commands(self) -> typing.Iterator[Command]:
+        while self.__cur_command is not None:
+            yield self.__cur_command
+            self.__cur_command = self.__next_command
+            self.__next_command = next(self.__commands_stream, None)
 
     def has_more_commands(self) -> bool:
         """Are there more commands in the input?
@@ -41,7 +238,9 @@ class Parser:
         Returns:
             bool: True if there are more commands, False otherwise.
         """
-        if self.__lines_index < len(self.__input_lines) - 1:
+        if self.__streaming:
+            return self.__next_command is not None
+        if self.__commands_index < len(self.__commands) - 1:
             return True
         return False
 
@@ -49,8 +248,12 @@ class Parser:
         """Reads the next command from the input and makes it the current command.
         Should be called only if has_more_commands() is true.
         """
-        self.__lines_index += 1
-        self.__cur_line = self.__input_lines[self.__lines_index]
+        if self.__streaming:
+            self.__cur_command = self.__next_command
+            self.__next_command = next(self.__commands_stream, None)
+            return
+        self.__commands_index += 1
+        self.__cur_command = self.__commands[self.__commands_index]
 
     def command_type(self) -> str:
         """
@@ -60,65 +263,47 @@ class Parser:
             "C_COMMAND" for dest=comp;jump
             "L_COMMAND" (actually, pseudo-command) for (Xxx) where Xxx is a symbol
         """
-        # Read the first non-white-space character in the current command.
-        # If '@' - A-command, if '(' - L-command, else: C-command
-        first_char = self.__cur_line[0]
-        if first_char == '@':
-            return "A_COMMAND"
-        elif first_char == '(':
-            return "L_COMMAND"
-        else:
-            return "C_COMMAND"
+        return self.__cur_command.kind
 
     def symbol(self) -> str:
         """
         Returns:
             str: the symbol or decimal Xxx of the current command @Xxx or
-            (Xxx). Should be called only when command_type() is "A_COMMAND" or 
+            (Xxx). Should be called only when command_type() is "A_COMMAND" or
             "L_COMMAND".
         """
-        symbol = ""
-        for i in range(1, len(self.__cur_line)):  # start for index 1 of the string - past '(' and '@'
-            if self.__cur_line[i] != ')':
-                symbol += self.__cur_line[i]
-        return symbol
+        return self.__cur_command.symbol
 
     def dest(self) -> str:
         """
         Returns:
-            str: the dest mnemonic in the current C-command. Should be called 
+            str: the dest mnemonic in the current C-command. Should be called
             only when commandType() is "C_COMMAND".
         """
-        if self.__cur_line.__contains__("="):  # Destination isn't empty
-            return self.__cur_line.split("=")[0]
-        else:
-            return ""
+        return self.__cur_command.dest
 
     def comp(self) -> str:
         """
         Returns:
-            str: the comp mnemonic in the current C-command. Should be called 
+            str: the comp mnemonic in the current C-command. Should be called
             only when commandType() is "C_COMMAND".
         """
-        if self.__cur_line.__contains__("="):  # Destination isn't empty
-            post_eq: str = self.__cur_line.split("=")[1]
-            return post_eq.split(";")[0]
-        return self.__cur_line.split(";")[0]  # Dest is empty - it's enough to split by ';'
+        return self.__cur_command.comp
 
     def jump(self) -> str:
         """
         Returns:
-            str: the jump mnemonic in the current C-command. Should be called 
+            str: the jump mnemonic in the current C-command. Should be called
             only when commandType() is "C_COMMAND".
         """
-        split: list[str] = self.__cur_line.split(";")
-        if len(split) == 1:
-            return ""
-        return split[len(split) - 1]
+        return self.__cur_command.jump
 
     def reset(self) -> None:
         """
         Resets the index to 0- allowing the user to go over the file again.
+        Not supported by streaming parsers.
         """
-        self.__lines_index = 0
-        self.__cur_line = self.__input_lines[self.__lines_index]
+        if self.__streaming:
+            raise ValueError("A streaming parser cannot be reset")
+        self.__commands_index = 0
+        self.__cur_command = self.__commands[self.__commands_index]
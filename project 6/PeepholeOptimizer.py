@@ -0,0 +1,158 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import collections
+import typing
+from Parser import Parser, Command
+
+# Each rule is (name, pattern, replacement, a_dead). Patterns are matched
+# against consecutive instructions of a straight-line block (no labels and no
+# jumps inside the window). "@{X}" matches any A-instruction and binds X to its
+# symbol; a name used twice must bind the same symbol both times.
+# A replacement leaves D and the whole RAM exactly as the pattern does. Unless
+# a_dead is True, it leaves A the same as well. Rules with a_dead set may leave
+# a different value in A, so they only fire right before an A-instruction,
+# which overwrites it anyway.
+RULES = [
+    # push D; pop into D (e.g. "push local 0" followed by "pop that 0"):
+    ("push_pop",
+     ("@SP", "AM=M+1", "A=A-1", "M=D", "@SP", "AM=M-1", "D=M"),
+     ("@SP", "A=M", "M=D"), False),
+    ("push_pop",
+     ("@SP", "M=M+1", "A=M-1", "M=D", "@SP", "AM=M-1", "D=M"),
+     ("@SP", "A=M", "M=D"), False),
+    # SP incremented and immediately decremented again:
+    ("inc_dec_sp",
+     ("@SP", "M=M+1", "@SP", "AM=M-1"),
+     ("@SP", "A=M"), False),
+    # An address that is overwritten before it is used:
+    ("dead_load",
+     ("@{X}", "@{Y}"),
+     ("@{Y}",), False),
+    # Reloading an address that is still in A:
+    ("reload",
+     ("@{X}", "M=D", "@{X}"),
+     ("@{X}", "M=D"), False),
+    ("reload",
+     ("@{X}", "D=M", "@{X}"),
+     ("@{X}", "D=M"), False),
+    ("reload",
+     ("@{X}", "M=M+1", "@{X}"),
+     ("@{X}", "M=M+1"), False),
+    ("reload",
+     ("@{X}", "M=M-1", "@{X}"),
+     ("@{X}", "M=M-1"), False),
+    # D stores that are overwritten before they are read:
+    ("dead_store",
+     ("D=M", "@{X}", "D=A"),
+     ("@{X}", "D=A"), False),
+    ("dead_store",
+     ("D=M", "@{X}", "D=M"),
+     ("@{X}", "D=M"), False),
+    ("dead_store",
+     ("D=A", "@{X}", "D=A"),
+     ("@{X}", "D=A"), False),
+    ("dead_store",
+     ("D=A", "@{X}", "D=M"),
+     ("@{X}", "D=M"), False),
+    # Binary operations that pop both operands and push the result back
+    # ("add", "sub"), instead of overwriting x in place:
+    ("binary_in_place",
+     ("@SP", "AM=M-1", "D=M", "@SP", "AM=M-1", "M=M+D", "@SP", "M=M+1"),
+     ("@SP", "AM=M-1", "D=M", "A=A-1", "M=M+D"), True),
+    ("binary_in_place",
+     ("@SP", "AM=M-1", "D=M", "@SP", "AM=M-1", "M=M-D", "@SP", "M=M+1"),
+     ("@SP", "AM=M-1", "D=M", "A=A-1", "M=M-D"), True),
+]
+
+
+class PeepholeOptimizer:
+    """Rewrites short sequences of Hack instructions into shorter, equivalent
+    ones, according to RULES. A window never spans a label (which may be a
+    jump target) or a jump, so control flow is never affected. If the
+    program may jump to numeric ROM addresses, the instructions up to the
+    highest of them are left untouched, so that no such target moves.
+    """
+
+    def __init__(self, rules: typing.Sequence[tuple] = RULES) -> None:
+        """
+        Args:
+            rules (typing.Sequence[tuple]): the rule table to apply.
+        """
+        self.__rules = rules
+        self.removed = 0
+        self.fired: typing.Counter[str] = collections.Counter()
+
+    def optimize(self, commands: typing.Iterable[Command]) -> typing.List[Command]:
+        """Applies the rules until none of them matches anymore.
+
+        Args:
+            commands (typing.Iterable[Command]): the decoded program.
+
+        Returns:
+            typing.List[Command]: the optimized program.
+        """
+        commands = list(commands)
+        fixed = Parser.fixed_addresses(commands)
+        while True:
+            optimized = self.__optimize_once(commands, fixed)
+            if len(optimized) == len(commands):
+                return commands
+            self.removed += len(commands) - len(optimized)
+            commands = optimized
+
+    def __optimize_once(self, commands: typing.List[Command], fixed: int) -> typing.List[Command]:
+        optimized = list()
+        index = 0
+        address = 0  # The ROM address of commands[index], until it reaches fixed
+        while index < len(commands):
+            if address < fixed:
+                address += commands[index].kind != "L_COMMAND"
+                optimized.append(commands[index])
+                index += 1
+                continue
+            for name, pattern, replacement, a_dead in self.__rules:
+                bindings = self.__match(commands, index, pattern, a_dead)
+                if bindings is not None:
+                    # Replacements are never longer than their patterns, so each new
+                    # instruction keeps the source line of the one it replaces.
+                    for offset, text in enumerate(replacement):
+                        if text.startswith("@{"):
+                            text = "@" + bindings[text[2:-1]]
+                        optimized.append(Parser.decode(text, commands[index + offset].line))
+                    self.fired[name] += 1
+                    index += len(pattern)
+                    break
+            else:
+                optimized.append(commands[index])
+                index += 1
+        return optimized
+
+    @staticmethod
+    def __match(commands: typing.List[Command], index: int, pattern: typing.Sequence[str],
+                a_dead: bool) -> typing.Optional[typing.Dict[str, str]]:
+        end = index + len(pattern)
+        if end > len(commands) or (a_dead and (end == len(commands) or commands[end].kind != "A_COMMAND")):
+            return None
+        bindings = dict()
+        for text, command in zip(pattern, commands[index:end]):
+            if command.kind == "L_COMMAND" or command.jump:
+                return None
+            if text.startswith("@{"):
+                if command.kind != "A_COMMAND" or bindings.setdefault(text[2:-1], command.symbol) != command.symbol:
+                    return None
+            elif command.text != text:
+                return None
+        return bindings
+
+    def report(self) -> str:
+        """
+        Returns:
+            str: how many instructions were removed, and by which rules.
+        """
+        fired = ", ".join("{} x{}".format(name, count) for name, count in self.fired.most_common())
+        return "removed {} instructions ({})".format(self.removed, fired or "no rule fired")
@@ -0,0 +1,115 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import array
+import bisect
+import typing
+
+MAP_EXTENSION = ".map"
+
+
+class SymbolMap:
+    """Links the addresses of an assembled program back to its source: the
+    ROM address of every label, the RAM address of every variable, and the
+    source line of every instruction.
+
+    The line index is kept as two sorted arrays. Consecutive instructions
+    that come from consecutive source lines form a single run, and only the
+    start of each run is stored, so lookups are a bisection.
+    """
+
+    def __init__(self) -> None:
+        self.labels: typing.Dict[str, int] = dict()
+        self.variables: typing.Dict[str, int] = dict()
+        self.__run_addresses = array.array('L')
+        self.__run_lines = array.array('L')
+        self.__sorted_labels: typing.Optional[typing.Tuple[typing.List[int], typing.List[str]]] = None
+
+    def add_line(self, address: int, line: int) -> None:
+        """Records the source line of an instruction. Instructions must be
+        added in order of their addresses.
+
+        Args:
+            address (int): the ROM address of the instruction.
+            line (int): the number of its source line.
+        """
+        if self.__run_addresses:
+            start = self.__run_addresses[-1]
+            if line == self.__run_lines[-1] + (address - start):  # Continues the current run
+                return
+        self.__run_addresses.append(address)
+        self.__run_lines.append(line)
+
+    def line_of(self, address: int) -> typing.Optional[int]:
+        """
+        Args:
+            address (int): a ROM address.
+
+        Returns:
+            typing.Optional[int]: the source line of the instruction in the
+            address, or None if it is before the first instruction.
+        """
+        index = bisect.bisect_right(self.__run_addresses, address) - 1
+        if index < 0:
+            return None
+        return self.__run_lines[index] + (address - self.__run_addresses[index])
+
+    def label_of(self, address: int) -> typing.Optional[str]:
+        """
+        Args:
+            address (int): a ROM address.
+
+        Returns:
+            typing.Optional[str]: the closest label at or before the address
+            (e.g. the function it belongs to), or None if there is none.
+        """
+        if self.__sorted_labels is None:
+            ordered = sorted((label_address, label) for label, label_address in self.labels.items())
+            self.__sorted_labels = ([label_address for label_address, _ in ordered], [label for _, label in ordered])
+        addresses, names = self.__sorted_labels
+        index = bisect.bisect_right(addresses, address) - 1
+        if index < 0:
+            return None
+        return names[index]
+
+    def write(self, output_file: typing.TextIO) -> None:
+        """
+        Args:
+            output_file (typing.TextIO): writes the map here.
+        """
+        output_file.write("// labels: <name> <ROM address>\n")
+        for label, address in sorted(self.labels.items(), key=lambda item: item[1]):
+            output_file.write("L {} {}\n".format(label, address))
+        output_file.write("// variables: <name> <RAM address>\n")
+        for variable, address in sorted(self.variables.items(), key=lambda item: item[1]):
+            output_file.write("V {} {}\n".format(variable, address))
+        output_file.write("// lines: <first ROM address of a run> <its source line>\n")
+        for address, line in zip(self.__run_addresses, self.__run_lines):
+            output_file.write("R {} {}\n".format(address, line))
+
+    @staticmethod
+    def read(input_file: typing.TextIO) -> "SymbolMap":
+        """
+        Args:
+            input_file (typing.TextIO): a map written by write().
+
+        Returns:
+            SymbolMap: the map in the file.
+        """
+        symbol_map = SymbolMap()
+        for line in input_file:
+            if line.startswith("//") or not line.strip():
+                continue
+            kind, name, value = line.split()
+            if kind == "L":
+                symbol_map.labels[name] = int(value)
+            elif kind == "V":
+                symbol_map.variables[name] = int(value)
+            else:
+                symbol_map.__run_addresses.append(int(name))
+                symbol_map.__run_lines.append(int(value))
+        return symbol_map
@@ -0,0 +1,48 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import unittest
+from DeadCodeEliminator import DeadCodeEliminator
+from Parser import Parser
+from PeepholeOptimizer import PeepholeOptimizer
+
+# Jumps to ROM address 9 through R13. "@1" is a dead load, and the code after
+# "0;JMP" has no label, so both passes would change it if they missed the
+# numeric target.
+INDIRECT_JUMP = ("@9", "D=A", "@R13", "M=D", "@1", "@R13", "A=M", "0;JMP",
+                 "D=M", "@42", "D=A", "@R0", "M=D", "(END)", "@END", "0;JMP")
+
+
+class FixedAddressesTest(unittest.TestCase):
+    """Regression tests for programs that jump to numeric ROM addresses."""
+
+    def test_indirect_jump(self) -> None:
+        commands = [Parser.decode(text) for text in INDIRECT_JUMP]
+        self.assertEqual(Parser.fixed_addresses(commands), 10)
+        for optimizer in (PeepholeOptimizer(), DeadCodeEliminator()):
+            optimized = optimizer.optimize(commands)
+            self.assertEqual([command.text for command in optimized], list(INDIRECT_JUMP))
+
+    def test_predefined_symbol_jump(self) -> None:
+        commands = [Parser.decode(text) for text in ("@R3", "0;JMP", "@1", "@2", "D=A", "0;JMP")]
+        self.assertEqual(Parser.fixed_addresses(commands), 4)
+
+    def test_addresses_after_the_targets_are_optimized(self) -> None:
+        commands = [Parser.decode(text) for text in ("@2", "0;JMP", "@END", "0;JMP", "@1", "D=M", "(END)",
+                                                     "@1", "@2", "D=A", "@END", "0;JMP")]
+        optimized = PeepholeOptimizer().optimize(commands)
+        self.assertEqual([command.text for command in optimized][:6], ["@2", "0;JMP", "@END", "0;JMP", "@1", "D=M"])
+        self.assertEqual(len(optimized), len(commands) - 1)  # The dead "@1" after the targets
+
+    def test_jmp_with_any_computation_is_unconditional(self) -> None:
+        commands = [Parser.decode(text) for text in ("@END", "D;JMP", "D=M", "(END)", "@END", "0;JMP")]
+        optimized = DeadCodeEliminator().optimize(commands)
+        self.assertEqual([command.text for command in optimized], ["@END", "D;JMP", "(END)", "@END", "0;JMP"])
+
+
+if "__main__" == __name__:
+    unittest.main()
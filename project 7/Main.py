@@ -8,7 +8,7 @@ Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
 import os
 import sys
 import typing
-from Parser import Parser
+from Parser import Parser, CommandType
 from CodeWriter import CodeWriter
 
 
@@ -22,25 +22,16 @@ def translate_file(
     """
     input_filename, input_extension = os.path.splitext(os.path.basename(input_file.name))
 
-    parser = Parser(input_file)
+    parser = Parser(input_file, streaming=True)
     code_writer = CodeWriter(output_file)
     code_writer.set_file_name(input_filename)
 
-    while True:
-        command_type: str = parser.command_type()
-
-        if command_type == "C_ARITHMETIC":
-            arg1 = parser.arg1()  # The command itself
-            code_writer.write_arithmetic(arg1)
-
-        if command_type in {"C_POP", "C_PUSH"}:
-            arg1 = parser.arg1()
-            arg2 = parser.arg2()
-            code_writer.write_push_pop(command_type, arg1, arg2)
-
-        if not parser.has_more_commands():
-            break
-        parser.advance()
+    for command in parser.commands():
+        command_type = command.kind
+        if command_type == CommandType.C_ARITHMETIC:
+            code_writer.write_arithmetic(command.arg1)  # arg1 is the command itself
+        elif command_type == CommandType.C_PUSH or command_type == CommandType.C_POP:
+            code_writer.write_push_pop(command_type, command.arg1, command.arg2)
 
 
 if "__main__" == __name__:
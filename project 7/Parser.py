@@ -5,9 +5,44 @@ was written by Aviv Yaish. It is an extension to the specifications given
 as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
 Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
+import enum
 import typing
 
 
+class CommandType(str, enum.Enum):
+    """The type of a VM command. Members are strings equal to their names
+    (e.g. CommandType.C_PUSH == "C_PUSH"), so they can be compared with the
+    command type strings directly.
+    """
+    C_ARITHMETIC = "C_ARITHMETIC"
+    C_PUSH = "C_PUSH"
+    C_POP = "C_POP"
+    C_LABEL = "C_LABEL"
+    C_GOTO = "C_GOTO"
+    C_IF = "C_IF"
+    C_FUNCTION = "C_FUNCTION"
+    C_RETURN = "C_RETURN"
+    C_CALL = "C_CALL"
+
+
+class VMCommand:
+    """A single VM command, split and decoded exactly once."""
+    __slots__ = ("kind", "arg1", "arg2")
+
+    def __init__(self, kind: CommandType, arg1: str = "", arg2: typing.Optional[int] = None) -> None:
+        """
+        Args:
+            kind (CommandType): the type of the command.
+            arg1 (str): the first argument of the command. For arithmetic
+                commands, the command itself (add, sub, etc.).
+            arg2 (typing.Optional[int]): the second argument of "C_PUSH",
+                "C_POP", "C_FUNCTION" and "C_CALL" commands, None otherwise.
+        """
+        self.kind = kind
+        self.arg1 = arg1
+        self.arg2 = arg2
+
+
 class Parser:
     """
     # Parser
@@ -61,36 +96,76 @@ class Parser:
     }
 
     MEMORY_COMMANDS = {
-        "pop": "C_POP",
-        "push": "C_PUSH",
-        "label": "C_LABEL",  # TODO - Placeholder until project 8
-        "goto": "C_GOTO",  # TODO - Placeholder until project 8
-        "if": "C_IF",  # TODO - Placeholder until project 8
-        "function": "C_FUNCTION",  # TODO - Placeholder until project 8
-        "return": "C_RETURN",  # TODO - Placeholder until project 8
-        "call": "C_CALL"  # TODO - Placeholder until project 8
+        "pop": CommandType.C_POP,
+        "push": CommandType.C_PUSH,
+        "label": CommandType.C_LABEL,  # TODO - Placeholder until project 8
+        "goto": CommandType.C_GOTO,  # TODO - Placeholder until project 8
+        "if": CommandType.C_IF,  # TODO - Placeholder until project 8
+        "function": CommandType.C_FUNCTION,  # TODO - Placeholder until project 8
+        "return": CommandType.C_RETURN,  # TODO - Placeholder until project 8
+        "call": CommandType.C_CALL  # TODO - Placeholder until project 8
 
     }
 
-    def __init__(self, input_file: typing.TextIO) -> None:
+    def __init__(self, input_file: typing.Iterable[str], streaming: bool = False) -> None:
         """Gets ready to parse the input file.
 
         Args:
-            input_file (typing.TextIO): input file.
+            input_file (typing.Iterable[str]): input file, or any other
+                iterable of lines.
+            streaming (bool): if True, nothing is read up front, and the
+                commands can only be walked once, through commands(). The
+                current command accessors are not supported.
+        """
+        self.__streaming = streaming
+        self.__input_file = input_file
+        if streaming:
+            return
+        self.__commands: typing.List[VMCommand] = list(Parser.parse(input_file))
+        self.__commands_index = 0
+        self.__cur_command: VMCommand = self.__commands[self.__commands_index]
+
+    @staticmethod
+    def parse(input_file: typing.Iterable[str]) -> typing.Iterator[VMCommand]:
+        """Lazily reads the input file one line at a time, and yields its
+        commands. Comments, white spaces and empty lines are skipped.
+
+        Args:
+            input_file (typing.Iterable[str]): input file or lines.
+
+        Yields:
+            VMCommand: the next command in the file.
+        """
+        for line in input_file:
+            words = line.split("//")[0].split()  # get rid of comments
+            if words:  # In case line was just a comment or white-spaces
+                yield Parser.decode(words)
+
+    @staticmethod
+    def decode(words: typing.List[str]) -> VMCommand:
+        """
+        Args:
+            words (typing.List[str]): the words of a single command.
+
+        Returns:
+            VMCommand: the decoded command.
         """
-        self.__input_lines = list()
-        self.strip_lines(input_file)
+        command = words[0]
+        if command in Parser.ARITHMETIC_LOGICAL_COMMANDS:
+            return VMCommand(CommandType.C_ARITHMETIC, command)
+        return VMCommand(Parser.MEMORY_COMMANDS[command], words[1] if len(words) > 1 else "",
+                         int(words[2]) if len(words) > 2 else None)
 
-        self.__lines_index = 0
-        self.__cur_line: str = self.__input_lines[self.__lines_index]
+    def commands(self) -> typing.Iterator[VMCommand]:
+        """Iterates over all the commands, from the first one. On a streaming
+        parser, this reads the input as it goes, and can only be done once.
 
-    def strip_lines(self, input_file: typing.TextIO) -> None:
-        lines_raw: list[str] = input_file.read().strip().splitlines()
-        for line in lines_raw:
-            cur_line = line.strip()
-            cur_line = cur_line.split("//")[0]  # get rid of comments
-            if len(cur_line) > 0:  # In case line was just a comment or white-spaces
-                self.__input_lines.append(cur_line)
+        Returns:
+            typing.Iterator[VMCommand]: the commands of the file.
+        """
+        if not self.__streaming:
+            return iter(self.__commands)
+        return Parser.parse(self.__input_file)
 
     def has_more_commands(self) -> bool:
         """Are there more commands in the input?
@@ -98,7 +173,7 @@ class Parser:
         Returns:
             bool: True if there are more commands, False otherwise.
         """
-        if self.__lines_index < len(self.__input_lines) - 1:
+        if self.__commands_index < len(self.__commands) - 1:
             return True
         return False
 
@@ -107,8 +182,8 @@ class Parser:
         command. Should be called only if has_more_commands() is true. Initially
         there is no current command.
         """
-        self.__lines_index += 1
-        self.__cur_line = self.__input_lines[self.__lines_index]
+        self.__commands_index += 1
+        self.__cur_command = self.__commands[self.__commands_index]
 
     def command_type(self) -> str:
         """
@@ -119,12 +194,7 @@ class Parser:
             "C_PUSH", "C_POP", "C_LABEL", "C_GOTO", "C_IF", "C_FUNCTION",
             "C_RETURN", "C_CALL".
         """
-        # TODO - For project 8 - implement support for the rest of the commands
-        command: str = self.__cur_line.split()[0]
-        if command in Parser.ARITHMETIC_LOGICAL_COMMANDS:
-            return "C_ARITHMETIC"
-        else:
-            return Parser.MEMORY_COMMANDS[command]
+        return self.__cur_command.kind
 
     def arg1(self) -> str:
         """
@@ -133,11 +203,7 @@ class Parser:
             "C_ARITHMETIC", the command itself (add, sub, etc.) is returned. 
             Should not be called if the current command is "C_RETURN".
         """
-        # TODO - For project 8 - implement reading lines which aren't C/Memory commands.
-        if self.command_type() == "C_ARITHMETIC":
-            return self.__cur_line.split()[0]
-        else:  # Not an arithmetic command - return first argument:
-            return self.__cur_line.split()[1]
+        return self.__cur_command.arg1
 
     def arg2(self) -> int:
         """
@@ -146,5 +212,4 @@ class Parser:
             called only if the current command is "C_PUSH", "C_POP", 
             "C_FUNCTION" or "C_CALL".
         """
-        val = self.__cur_line.split()[2]
-        return int(val)
+        return self.__cur_command.arg2
@@ -5,26 +5,215 @@ was written by Aviv Yaish. It is an extension to the specifications given
 as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
 Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
+import collections
+import string
 import typing
 
+# Number of fragments collected before they are written to the output stream.
+FLUSH_FRAGMENTS = 4096
+# With a cached top of stack, pops to segment indexes below this walk A up
+# from the segment base one word at a time, instead of computing the address.
+NEAR_INDEXES = 8
+# With compact locals, functions with up to this many locals zero them with
+# straight-line code, and functions with more of them with a loop.
+UNROLLED_LOCALS = 8
+# With specialized segments, the sequences of segment indexes below this are
+# precomputed. Larger indexes of local, argument, this and that use the
+# general sequences.
+SPECIALIZED_INDEXES = 8
+
+
+def count_words(code: str) -> int:
+    """
+    Args:
+        code (str): assembly code.
+
+    Returns:
+        int: the number of Hack instructions in the code (labels, comments and
+        empty lines take no ROM words).
+    """
+    return sum(1 for line in code.split("\n") if line.split("//")[0].strip() and not line.strip().startswith("("))
+
+
+class Template:
+    """An assembly template (in str.format syntax), split once into its
+    constant parts and the names of the fields between them, so filling it in
+    is a single join instead of a str.format call.
+    """
+
+    def __init__(self, text: str, comments: bool = True) -> None:
+        """
+        Args:
+            text (str): the template.
+            comments (bool): if False, comments, white spaces and empty lines
+                are removed from the template up front.
+        """
+        if not comments:
+            lines = ("".join(line.split("//")[0].split()) for line in text.split("\n"))
+            text = "".join(line + "\n" for line in lines if line)
+        self.__parts: typing.List[str] = [""]  # __parts[i] comes before __fields[i], the last one after them all
+        self.__fields: typing.List[str] = list()
+        for literal, field, _, _ in string.Formatter().parse(text):
+            self.__parts[-1] += literal
+            if field is not None:
+                self.__fields.append(field)
+                self.__parts.append("")
+        self.constant: typing.Optional[str] = self.__parts[0] if not self.__fields else None
+        # Number of Hack instructions in the template (labels take no ROM words).
+        self.words = count_words(text)
+
+    def render(self, **values: typing.Any) -> str:
+        """
+        Args:
+            **values (typing.Any): the value of every field of the template.
+                Other values are ignored.
+
+        Returns:
+            str: the filled in template.
+        """
+        if self.constant is not None:
+            return self.constant
+        fragments = [self.__parts[0]]
+        for field, part in zip(self.__fields, self.__parts[1:]):
+            fragments.append(str(values[field]))
+            fragments.append(part)
+        return "".join(fragments)
+
 
 class CodeWriter:
     """Translates VM commands into Hack assembly code."""
 
-    def __init__(self, output_stream: typing.TextIO) -> None:
+    # Templates compiled from the tables at the end of the class, once for
+    # every mode (with or without comments).
+    __compiled: typing.Dict[bool, typing.Dict[str, Template]] = dict()
+    # (command, segment, index) -> the shortest sequence and the ROM words it
+    # saves, for every mode (see __specialize):
+    __specialized: typing.Dict[bool, typing.Dict[typing.Tuple[str, str, int], typing.Tuple[str, int]]] = dict()
+
+    def __init__(self, output_stream: typing.TextIO, comments: bool = True, shared_calls: bool = False,
+                 shared_compare: bool = False, cache_top: bool = False, tail_calls: bool = False,
+                 compact_locals: bool = False, specialize_segments: bool = False) -> None:
         """Initializes the CodeWriter.
 
         Args:
-            output_stream (typing.TextIO): output stream.
+            output_stream (typing.TextIO): output stream. The code is
+                collected in memory and written in large blocks, so flush()
+                must be called when the translation is done.
+            comments (bool): if False, the output holds only instructions and
+                labels, without comments or empty lines.
+            shared_calls (bool): if True, call and return commands jump to
+                shared $$CALL and $$RETURN routines, which are written with
+                the bootstrap code, instead of being inlined.
+            shared_compare (bool): if True, eq, gt and lt commands jump to
+                shared routines, which are written with the bootstrap code,
+                instead of being inlined.
+            cache_top (bool): if True, the top of the stack is kept in D
+                between commands, and written back to the stack only at
+                labels, jumps, calls, returns and comparisons.
+            tail_calls (bool): if True, the $$TAILCALL routine that
+                write_tail_call jumps to is written with the bootstrap code.
+            compact_locals (bool): if True, function entries zero their locals
+                with shorter code, chosen by the number of locals.
+            specialize_segments (bool): if True, every push and pop uses the
+                shortest sequence for its segment and index, and pops never
+                go through R15.
         """
         self.output_stream = output_stream
         self.label_index = 0
         self.return_count = 0
         self.current_filename = "NO_FILE_SET"
         self.current_function = "NA"
+        self.__buffer: typing.List[str] = list()
+        self.shared_calls = shared_calls
+        self.shared_compare = shared_compare
+        self.cache_top = cache_top
+        self.tail_calls = tail_calls
+        self.compact_locals = compact_locals
+        self.specialize_segments = specialize_segments
+        # True while the top of the stack is cached in D. SP then points to
+        # where it would be stored, so the stack in RAM is one word shorter.
+        self.__top_in_d = False
+        # ROM words saved by each optimization, compared to the plain translation:
+        self.words_saved: typing.Counter[str] = collections.Counter()
+        if comments not in CodeWriter.__compiled:
+            CodeWriter.__compiled[comments] = {
+                name: Template(text, comments)
+                for table in (CodeWriter.ARITHMETIC_COMMANDS, CodeWriter.PUSH_POP_CMDS, CodeWriter.FLOW_CMDS,
+                              CodeWriter.COMPARE_ROUTINES, CodeWriter.CACHED_CMDS, CodeWriter.FUSED_CMDS,
+                              CodeWriter.TAIL_CALL_CMDS, CodeWriter.LOCALS_CMDS)
+                for name, text in table.items()}
+        self.__templates = CodeWriter.__compiled[comments]
+        if specialize_segments and comments not in CodeWriter.__specialized:
+            CodeWriter.__specialized[comments] = CodeWriter.__specialize(self.__templates, comments)
+        self.__sequences = CodeWriter.__specialized.get(comments, dict())
+
+    @staticmethod
+    def __specialize(templates: typing.Dict[str, Template],
+                     comments: bool) -> typing.Dict[typing.Tuple[str, str, int], typing.Tuple[str, int]]:
+        # Builds the table of the shortest push and pop sequences, from the
+        # candidates in SPECIALIZED_CMDS, along with the words each one saves
+        # compared to the general sequence of write_push_pop.
+        sequences: typing.Dict[typing.Tuple[str, str, int], typing.Tuple[str, int]] = dict()
+        push_D = templates["push_D"].words
+
+        def shortest(key: typing.Tuple[str, str, int], general: int, candidates: typing.List[str]) -> None:
+            best = min((Template(text, comments) for text in candidates), key=lambda template: template.words)
+            sequences[key] = (best.constant, general - best.words)
+
+        for segment, segment_code in CodeWriter.SEGMENT_CODES.items():
+            for index in range(SPECIALIZED_INDEXES):
+                values = dict(segment=segment, segment_code=segment_code, index=index,
+                              increments="A=A+1 \n" * index, more_increments="A=A+1 \n" * (index - 1))
+                names = ("", "_plus_one") if index > 0 else ("",)
+                shortest(("C_PUSH", segment, index),
+                         templates["load_D"].words + push_D,
+                         [CodeWriter.SPECIALIZED_CMDS["push_far"].format(**values)] +
+                         [CodeWriter.SPECIALIZED_CMDS["push_walk" + name].format(**values) for name in names])
+                shortest(("C_POP", segment, index),
+                         templates["pop_segment"].words,
+                         [CodeWriter.SPECIALIZED_CMDS["pop_far"].format(**values)] +
+                         [CodeWriter.SPECIALIZED_CMDS["pop_walk" + name].format(**values) for name in names])
+        for segment, base_address, size in (("pointer", 3, 2), ("temp", 5, 8)):
+            for index in range(size):
+                values = dict(segment=segment, index=index, address=base_address + index)
+                shortest(("C_PUSH", segment, index), templates["push_temp_or_pointer"].words,
+                         [CodeWriter.SPECIALIZED_CMDS["push_fixed"].format(**values)])
+                shortest(("C_POP", segment, index), templates["pop_temp_or_pointer"].words,
+                         [CodeWriter.SPECIALIZED_CMDS["pop_fixed"].format(**values)])
+        for index in range(SPECIALIZED_INDEXES):
+            candidates = [CodeWriter.SPECIALIZED_CMDS["push_constant"].format(index=index)]
+            if index <= 1:
+                candidates.append(CodeWriter.SPECIALIZED_CMDS["push_small_constant"].format(index=index))
+            shortest(("C_PUSH", "constant", index), templates["push_const"].words, candidates)
+        return sequences
+
+    def emit(self, text: str) -> None:
+        """Adds code to the output. Code is written to the output stream in
+        large blocks.
+
+        Args:
+            text (str): the code to add.
+        """
+        self.__buffer.append(text)
+        if len(self.__buffer) >= FLUSH_FRAGMENTS:
+            self.flush()
+
+    def flush(self) -> None:
+        """Writes all the code collected so far to the output stream."""
+        if self.__buffer:
+            self.output_stream.write("".join(self.__buffer))
+            self.__buffer.clear()
+
+    def spill_top(self) -> None:
+        """Writes the top of the stack back to the stack, if it is cached in
+        D. Must be called at the end of the translation.
+        """
+        if self.__top_in_d:
+            self.emit(self.__templates["spill"].constant)
+            self.__top_in_d = False
 
     def set_file_name(self, filename: str) -> None:
-        """Informs the code writer that the translation of a new VM file is 
+        """Informs the code writer that the translation of a new VM file is
         started.
 
         Args:
@@ -35,7 +224,7 @@ class CodeWriter:
         self.current_filename = filename
 
     def write_arithmetic(self, command: str) -> None:
-        """Writes assembly code that is the translation of the given 
+        """Writes assembly code that is the translation of the given
         arithmetic command. For the commands: eq, lt, gt, you should correctly
         compare between all numbers our computer supports, and we define the
         value "true" to be -1, and "false" to be 0.
@@ -43,43 +232,78 @@ class CodeWriter:
         Args:
             command (str): an arithmetic command.
         """
-        output: str = CodeWriter.ARITHMETIC_COMMANDS[command]
+        template: Template = self.__templates[command]
+        if self.cache_top:
+            if command in CodeWriter.CACHED_COMPUTATIONS:
+                if not self.__top_in_d:
+                    self.emit(self.__templates["load_top"].constant)
+                cached: Template = self.__templates["unary" if command in CodeWriter.UNARY_COMMANDS else "binary"]
+                self.emit(cached.render(command=command, computation=CodeWriter.CACHED_COMPUTATIONS[command]))
+                self.__top_in_d = True
+                return
+            self.spill_top()  # Comparisons work on the stack in RAM
+        if self.shared_compare and command in CodeWriter.COMPARE_COMMANDS:
+            return_label: str = self.current_filename + ".LABEL." + str(self.label_index)
+            self.label_index += 1
+            self.emit(self.__templates["shared_compare"].render(COMMAND=command, ROUTINE="$$" + command.upper(),
+                                                                RETURN_LABEL=return_label))
+            self.words_saved["shared comparisons"] += template.words - self.__templates["shared_compare"].words
+            return
         if command in {"add", "sub", "neg", "not", "shiftleft", "shiftright"}:  # Commands with no labels
-            self.output_stream.write(CodeWriter.ARITHMETIC_COMMANDS[command])
+            self.emit(template.constant)
         elif command == "eq" or command == "and" or command == "or":  # Commands with 2 labels
             label_result: str = self.current_filename + ".LABEL." + str(self.label_index)
             label_end: str = self.current_filename + ".LABEL." + str(self.label_index + 1)
-            self.output_stream.write(output.format(RES=label_result, END=label_end))
+            self.emit(template.render(RES=label_result, END=label_end))
             self.label_index += 2
         elif command == "gt" or command == "lt":  # Commands with 5 labels
             labels = list()
             for i in range(0, 5):
                 labels.append(self.current_filename + ".LABEL." + str(self.label_index + i))
-            self.output_stream.write(output.format(Y_LT_ZERO=labels[0],
-                                                   X_LT_Y=labels[1],
-                                                   SUBTRACT=labels[2],
-                                                   END=labels[3],
-                                                   Y_LT_X=labels[4])
-                                     )
+            self.emit(template.render(Y_LT_ZERO=labels[0],
+                                      X_LT_Y=labels[1],
+                                      SUBTRACT=labels[2],
+                                      END=labels[3],
+                                      Y_LT_X=labels[4])
+                      )
             self.label_index += 5
 
-    def write_push_pop(self, command: str, segment: str, index: int) -> None:
-        """Writes assembly code that is the translation of the given 
+    def write_push_pop(self, command: str, segment: str, index: int, static_file: typing.Optional[str] = None) -> None:
+        """Writes assembly code that is the translation of the given
         command, where command is either C_PUSH or C_POP.
 
         Args:
             command (str): "C_PUSH" or "C_POP".
             segment (str): the memory segment to operate on.
             index (int): the index in the memory segment.
+            static_file (typing.Optional[str]): the file whose static segment
+                is meant, if it is not the current file.
         """
+        if self.cache_top:
+            self.__write_cached_push_pop(command, segment, index, static_file)
+            return
+        if self.specialize_segments:
+            sequence = self.__sequences.get((command, segment, index))
+            if sequence is None and segment in CodeWriter.SEGMENT_CODES:
+                # Indexes out of the table: pushes are as short as they get, and pops skip R15
+                if command == "C_PUSH":
+                    self.push_from_segment(CodeWriter.SEGMENT_CODES[segment], str(index))
+                    return
+                template: Template = self.__templates["pop_direct"]
+                sequence = (template.render(segment=segment, index=index,
+                                            segment_code=CodeWriter.SEGMENT_CODES[segment]),
+                            self.__templates["pop_segment"].words - template.words)
+            if sequence is not None:
+                self.emit(sequence[0])
+                self.words_saved["specialized segments"] += sequence[1]
+                return
         if segment in {"local", "argument", "this", "that"}:
             segment_code: str = CodeWriter.SEGMENT_CODES[segment]
             if command == "C_PUSH":  # Push from segment (not static/constant)
                 self.push_from_segment(segment_code, str(index))
                 return
             elif command == "C_POP":  # Pop to segment (not static/constant)
-                self.output_stream.write(CodeWriter.PUSH_POP_CMDS["pop_segment"].format(segment_code=segment_code,
-                                                                                        index=index))
+                self.emit(self.__templates["pop_segment"].render(segment_code=segment_code, index=index))
                 return
         elif segment in {"temp", "pointer"}:
             # Set up the base index according to segment:
@@ -89,30 +313,140 @@ class CodeWriter:
                 base_address = 5
             # Write to file the push/pop command:
             if command == "C_PUSH":
-                self.output_stream.write(
-                    CodeWriter.PUSH_POP_CMDS["push_temp_or_pointer"].format(base_address=base_address, index=index))
+                self.emit(self.__templates["push_temp_or_pointer"].render(base_address=base_address, index=index))
                 return
             elif command == "C_POP":
-                self.output_stream.write(
-                    CodeWriter.PUSH_POP_CMDS["pop_temp_or_pointer"].format(base_address=base_address, index=index))
+                self.emit(self.__templates["pop_temp_or_pointer"].render(base_address=base_address, index=index))
         elif segment == "constant":  # Push to constant (pop is invalid)
-            self.output_stream.write(CodeWriter.PUSH_POP_CMDS["push_const"].format(const_value=index))
+            self.emit(self.__templates["push_const"].render(const_value=index))
             return
         elif segment == 'static':
+            file_name = static_file or self.current_filename
             if command == "C_PUSH":  # Push static
-                self.output_stream.write(CodeWriter.PUSH_POP_CMDS["push_static"].format(file_name=self.current_filename,
-                                                                                        index=index))
+                self.emit(self.__templates["push_static"].render(file_name=file_name, index=index))
                 return
             elif command == "C_POP":  # Pop static
-                self.output_stream.write(CodeWriter.PUSH_POP_CMDS["pop_static"].format(file_name=self.current_filename,
-                                                                                       index=index))
+                self.emit(self.__templates["pop_static"].render(file_name=file_name, index=index))
+
+    def __write_cached_push_pop(self, command: str, segment: str, index: int,
+                                static_file: typing.Optional[str]) -> None:
+        # A push only loads the value into D (after spilling the previous top),
+        # and a pop stores D, so a push followed by a pop never touches the stack.
+        if command == "C_PUSH":
+            self.spill_top()
+            if segment == "constant":
+                template: Template = self.__templates["push_small_constant" if index in (0, 1) else "push_constant"]
+                self.emit(template.render(index=index))
+            elif segment in CodeWriter.SEGMENT_CODES:
+                template = self.__templates["push_segment_{}".format(index) if index < 2 else "push_segment"]
+                self.emit(template.render(segment=segment, index=index,
+                                          segment_code=CodeWriter.SEGMENT_CODES[segment]))
+            else:
+                self.emit(self.__templates["push_address"].render(
+                    segment=segment, index=index, address=self.__fixed_address(segment, index, static_file)))
+            self.__top_in_d = True
+            return
+        if segment in CodeWriter.SEGMENT_CODES and index < NEAR_INDEXES:
+            code = self.__templates["pop_segment_near"].render(segment=segment, index=index,
+                                                               segment_code=CodeWriter.SEGMENT_CODES[segment]) + \
+                self.__templates["increment_A"].constant * index + self.__templates["store_D"].constant
+        elif segment in CodeWriter.SEGMENT_CODES:
+            code = self.__templates["pop_segment_far"].render(segment=segment, index=index,
+                                                              segment_code=CodeWriter.SEGMENT_CODES[segment])
+        else:
+            code = self.__templates["pop_address"].render(
+                segment=segment, index=index, address=self.__fixed_address(segment, index, static_file))
+        if not self.__top_in_d:
+            code = self.__templates["load_top"].constant + code
+            if self.specialize_segments:
+                # The whole stack is in RAM, so the specialized pops apply as they are
+                specialized = self.__specialized_pop(segment, index)
+                if specialized is not None and count_words(specialized) < count_words(code):
+                    self.words_saved["specialized segments"] += count_words(code) - count_words(specialized)
+                    code = specialized
+        self.emit(code)
+        self.__top_in_d = False
+
+    def __specialized_pop(self, segment: str, index: int) -> typing.Optional[str]:
+        # The shortest pop from the stack in RAM to segment[index], if it is specialized.
+        sequence = self.__sequences.get(("C_POP", segment, index))
+        if sequence is not None:
+            return sequence[0]
+        if segment in CodeWriter.SEGMENT_CODES:
+            return self.__templates["pop_direct"].render(segment=segment, index=index,
+                                                         segment_code=CodeWriter.SEGMENT_CODES[segment])
+        return None
+
+    def __fixed_address(self, segment: str, index: int,
+                        static_file: typing.Optional[str] = None) -> typing.Union[str, int]:
+        if segment == "static":
+            return (static_file or self.current_filename) + "." + str(index)
+        return (3 if segment == "pointer" else 5) + index
+
+    def write_fused(self, rule: str, values: typing.Dict[str, str]) -> None:
+        """Writes assembly code that is the translation of a window of
+        commands fused by the peephole optimizer.
+
+        Args:
+            rule (str): the name of the peephole rule that matched the window.
+            values (typing.Dict[str, str]): the words bound by the rule. The
+                static segment of another file is bound as "static@File".
+        """
+        self.spill_top()
+        self.emit(self.__templates["fused"].render(rule=rule, values=" ".join(values.values())))
+        if rule == "increment":
+            self.emit(self.__address(values["S"], int(values["I"])))
+            self.emit(self.__templates["update"].render(computation="M+1" if values["OP"] == "add" else "M-1"))
+        elif rule == "move":
+            target, target_index = values["T"], int(values["J"])
+            if target not in CodeWriter.SEGMENT_CODES or target_index < 2:  # Found without changing D
+                self.emit(self.__load(values["S"], int(values["I"])))
+                self.emit(self.__address(target, target_index))
+                self.emit(self.__templates["store_D"].constant)
+            else:
+                self.emit(self.__address(target, target_index))
+                self.emit(self.__templates["save_address"].constant)
+                self.emit(self.__load(values["S"], int(values["I"])))
+                self.emit(self.__templates["store_saved"].constant)
+        elif rule == "operand":
+            if values["S"] == "constant" and values["I"] == "1" and values["OP"] in ("add", "sub"):
+                self.emit(self.__templates["update_top"].render(computation="M+1" if values["OP"] == "add" else "M-1"))
+                return
+            self.emit(self.__load(values["S"], int(values["I"])))
+            self.emit(self.__templates["update_top"].render(computation=CodeWriter.FUSED_COMPUTATIONS[values["OP"]]))
+
+    def __address(self, segment: str, index: int) -> str:
+        # Code that loads the address of segment[index] into A (and may change D).
+        if segment in CodeWriter.SEGMENT_CODES:
+            template: Template = self.__templates["address_{}".format(index) if index < 2 else "address"]
+            return template.render(segment_code=CodeWriter.SEGMENT_CODES[segment], index=index)
+        segment, _, static_file = segment.partition("@")
+        return self.__templates["address_fixed"].render(address=self.__fixed_address(segment, index,
+                                                                                     static_file or None))
+
+    def __load(self, segment: str, index: int) -> str:
+        # Code that loads segment[index] into D.
+        if segment == "constant":
+            template: Template = self.__templates["small_constant" if index in (0, 1) else "constant"]
+            return template.render(index=index)
+        return self.__address(segment, index) + self.__templates["load_M"].constant
 
     def push_from_segment(self, segment_code: str, index: str) -> None:
-        self.output_stream.write(CodeWriter.PUSH_POP_CMDS["load_D"].format(segment_code=segment_code, index=index))
-        self.output_stream.write(CodeWriter.PUSH_POP_CMDS["push_D"])
+        self.emit(self.__templates["load_D"].render(segment_code=segment_code, index=index))
+        self.emit(self.__templates["push_D"].constant)
+
+    def label_prefix(self) -> str:
+        """
+        Returns:
+            str: the prefix of the labels declared in the current function
+            ("Xxx.foo$"), or in the current file if no function started yet.
+        """
+        if self.current_function == "NA":
+            return self.current_filename + "."
+        return self.current_filename + "." + self.current_function + "$"
 
     def write_label(self, label: str) -> None:
-        """Writes assembly code that affects the label command. 
+        """Writes assembly code that affects the label command.
         Let "Xxx.foo" be a function within the file Xxx.vm. The handling of
         each "label bar" command within "Xxx.foo" generates and injects the symbol
         "Xxx.foo$bar" into the assembly code stream.
@@ -122,11 +456,8 @@ class CodeWriter:
         Args:
             label (str): the label to write.
         """
-        if self.current_function == "NA":
-            prefix = self.current_filename + "."
-        else:
-            prefix = self.current_filename + "." + self.current_function + "$"
-        self.output_stream.write("\n(" + prefix + label + ")\n")
+        self.spill_top()
+        self.emit(self.__templates["label"].render(label=self.label_prefix() + label))
 
     def write_goto(self, label: str) -> None:
         """Writes assembly code that affects the goto command.
@@ -134,68 +465,71 @@ class CodeWriter:
         Args:
             label (str): the label to go to.
         """
-        if self.current_function == "NA":
-            prefix = self.current_filename + "."
-        else:
-            prefix = self.current_filename + "." + self.current_function + "$"
-        self.output_stream.write("\n@" + prefix + label + "\n")
-        self.output_stream.write("0;JMP\n")
+        self.spill_top()
+        self.emit(self.__templates["goto"].render(label=self.label_prefix() + label))
 
     def write_if(self, label: str) -> None:
-        """Writes assembly code that affects the if-goto command. 
+        """Writes assembly code that affects the if-goto command.
 
         Args:
             label (str): the label to go to.
         """
-        # todo PROJECT 8 - check
         # Jumps to given label if the last element in stack is true (-1)
-        self.output_stream.write("\n//if-goto command: \n")
-        self.output_stream.write("@SP\n")
-        self.output_stream.write("AM=M-1\n")
-        self.output_stream.write("D=M\n")
-
-        if self.current_function == "NA":
-            prefix = self.current_filename + "."
-        else:
-            prefix = self.current_filename + "." + self.current_function + "$"
-
-        self.output_stream.write("@" + prefix + label + "\n")
-        self.output_stream.write("D;JNE\n")  # TODO - is this ok? or change to actually check if -1?
+        if self.cache_top:
+            if not self.__top_in_d:
+                self.emit(self.__templates["load_top"].constant)
+            self.emit(self.__templates["cached_if_goto"].render(label=self.label_prefix() + label))
+            self.__top_in_d = False
+            return
+        self.emit(self.__templates["if_goto"].render(label=self.label_prefix() + label))
 
-    def write_function(self, function_name: str, n_vars: int) -> None:
-        """Writes assembly code that affects the function command. 
+    def write_function(self, function_name: str, n_vars: int, zero_locals: bool = True) -> None:
+        """Writes assembly code that affects the function command.
         The handling of each "function Xxx.foo" command within the file Xxx.vm
         generates and injects a symbol "Xxx.foo" into the assembly code stream,
         that labels the entry-point to the function's code.
-        In the subsequent assembly process, the assembler translates this 
+        In the subsequent assembly process, the assembler translates this
         symbol into the physical address where the function code starts.
 
         Args:
             function_name (str): the name of the function.
             n_vars (int): the number of local variables of the function.
+            zero_locals (bool): if False, the locals are only allocated, not
+                initialized to 0 (only with compact locals).
         """
+        self.spill_top()
         self.current_function = function_name
-        self.output_stream.write("\n//Function {FUNC_NAME}: \n".format(FUNC_NAME=function_name))
         # The pseudo-code of "function function_name n_vars" is:
         # (function_name)       // injects a function entry label into the code
-        function_label: str = "({FUNC_NAME})".format(FUNC_NAME=function_name)
-        self.output_stream.write(function_label + "\n")
+        self.emit(self.__templates["function"].render(FUNC_NAME=function_name))
         # repeat n_vars times:  // n_vars = number of local variables
         #   push constant 0     // initializes the local variables to 0
-        for i in range(n_vars):
-            self.output_stream.write("@SP \n"
-                                     "AM=M+1  //SP incremented \n"
-                                     "A=A-1 //A points to top of stack \n"
-                                     "M=0 //local variable initialized to 0 \n")
+        if not self.compact_locals or (n_vars <= 1 and zero_locals):
+            self.emit(self.__templates["push_zero"].constant * n_vars)
+            return
+        if not zero_locals:
+            code: str = self.__templates["allocate_local" if n_vars == 1 else "allocate_locals"].render(
+                N_VARS=n_vars)
+        elif n_vars <= UNROLLED_LOCALS:
+            code = self.__templates["zero_first_local"].constant + \
+                   self.__templates["zero_next_local"].constant * (n_vars - 1) + \
+                   self.__templates["zero_locals_end"].constant
+        else:
+            code = self.__templates["zero_locals_loop"].render(N_VARS=n_vars,
+                                                               LOOP=self.current_filename + ".LABEL." +
+                                                               str(self.label_index))
+            self.label_index += 1
+        self.emit(code)
+        self.words_saved["compact locals"] += self.__templates["push_zero"].words * n_vars - count_words(code)
 
     def write_call(self, function_name: str, n_args: int) -> None:
-        """Writes assembly code that affects the call command. 
+        """Writes assembly code that affects the call command.
         Let "Xxx.foo" be a function within the file Xxx.vm.
         The handling of each "call" command within Xxx.foo's code generates and
         injects a symbol "Xxx.foo$ret.i" into the assembly code stream, where
         "i" is a running integer (one such symbol is generated for each "call"
         command within "Xxx.foo").
-        This symbol is used to mark the return address within the caller's 
+        This symbol is used to mark the return address within the caller's
         code. In the subsequent assembly process, the assembler translates this
         symbol into the physical memory address of the command immediately
         following the "call" command.
@@ -204,110 +538,289 @@ class CodeWriter:
             function_name (str): the name of the function to call.
             n_args (int): the number of arguments of the function.
         """
-        self.output_stream.write("\n//Function call for function {FUNC_NAME}: \n".format(FUNC_NAME=function_name))
-        # The pseudo-code of "call function_name n_args" is:
-        # push return_address   // generates a label and pushes it to the stack
+        self.spill_top()
         return_label: str = "{FILE_NAME}.{CUR_FUNC}$ret.{I}".format(FILE_NAME=self.current_filename,
                                                                     CUR_FUNC=self.current_function,
                                                                     I=self.return_count)
         self.return_count += 1
-        labeling: str = "@" + return_label + "\n" \
-                                             "D=A \n" \
-                                             "@SP \n" \
-                                             "AM=M+1 \n" \
-                                             "A=A-1 \n" \
-                                             "M=D \n"
-        self.output_stream.write(labeling)
-        # push LCL              // saves LCL of the caller
-        self.output_stream.write("@LCL \n"
-                                 "D=M \n")
-        self.output_stream.write(CodeWriter.PUSH_POP_CMDS["push_D"])
-        # push ARG              // saves ARG of the caller
-        self.output_stream.write("@ARG \n"
-                                 "D=M \n")
-        self.output_stream.write(CodeWriter.PUSH_POP_CMDS["push_D"])
-        # push THIS             // saves THIS of the caller
-        self.output_stream.write("@THIS \n"
-                                 "D=M \n")
-        self.output_stream.write(CodeWriter.PUSH_POP_CMDS["push_D"])
-        # push THAT             // saves THAT of the caller
-        self.output_stream.write("@THAT \n"
-                                 "D=M \n")
-        self.output_stream.write(CodeWriter.PUSH_POP_CMDS["push_D"])
-        # ARG = SP-5-n_args     // repositions ARG
-        self.output_stream.write("@SP \n"
-                                 "D=M \n"
-                                 "@5 \n"
-                                 "D=D-A //D=SP-5\n")
-        self.output_stream.write("@" + str(n_args) + "\n")
-        self.output_stream.write("D=D-A //SP-5-n_args \n"
-                                 "@ARG \n"
-                                 "M=D //ARG = SP-5-n_args \n")
-        # LCL = SP              // repositions LCL
-        self.output_stream.write("@SP\n"
-                                 "D=M\n"
-                                 "@LCL\n"
-                                 "M=D\n")
-        # goto function_name    // transfers control to the callee
-        self.output_stream.write("@" + function_name + "\n")
-        self.output_stream.write("0;JMP \n")
-        # (return_address)      // injects the return address label into the code
-        self.output_stream.write("(" + return_label + ") \n")
+        if self.shared_calls:
+            self.emit(self.__templates["shared_call"].render(FUNC_NAME=function_name, RETURN_LABEL=return_label,
+                                                             N_ARGS=n_args))
+            self.words_saved["shared calls"] += self.__templates["call"].words - self.__templates["shared_call"].words
+            return
+        self.emit(self.__templates["call"].render(FUNC_NAME=function_name, RETURN_LABEL=return_label,
+                                                  N_ARGS=n_args))
+
+    def write_tail_call(self, function_name: str, n_args: int) -> None:
+        """Writes assembly code that affects a call command that is
+        immediately followed by a return command (which needs no code of its
+        own). The callee reuses the frame of the current function: its
+        arguments are copied over the current ones, and it returns straight
+        to the current function's caller. The stack does not grow, however
+        deep the recursion is.
+
+        Args:
+            function_name (str): the name of the function to call.
+            n_args (int): the number of arguments of the function.
+        """
+        self.spill_top()
+        move_frame: str = self.current_filename + ".LABEL." + str(self.label_index)
+        self.label_index += 1
+        code = [self.__templates["tail_call"].render(FUNC_NAME=function_name, FRAME_SIZE=n_args + 5,
+                                                     MOVE_FRAME=move_frame)]
+        for index in range(n_args):
+            if index < NEAR_INDEXES:
+                code.append(self.__templates["tail_call_argument"].render(DEPTH=n_args - index, INDEX=index))
+                code.append(self.__templates["increment_A"].constant * index)
+                code.append(self.__templates["store_D"].constant)
+            else:
+                code.append(self.__templates["tail_call_far_argument"].render(DEPTH=n_args - index, INDEX=index))
+        code.append(self.__templates["tail_call_jump"].render(FUNC_NAME=function_name, N_ARGS=n_args,
+                                                              MOVE_FRAME=move_frame))
+        self.emit("".join(code))
+        call, ret = ("shared_call", "shared_return") if self.shared_calls else ("call", "return")
+        self.words_saved["tail calls"] += \
+            self.__templates[call].words + self.__templates[ret].words - count_words("".join(code))
 
     def write_return(self) -> None:
         """Writes assembly code that affects the return command."""
-        self.output_stream.write("\n//return command: \n")
-        # The pseudo-code of "return" is:
-        # frame = LCL                   // frame is a temporary variable
-        self.output_stream.write("@LCL \n"
-                                 "D=M //D=LCL \n"
-                                 "@R13 \n"
-                                 "M=D // frame/LCL in R13 \n")
-        # return_address = *(frame-5)   // puts the return address in a temp var
-        self.output_stream.write("@5 \n"
-                                 "A=D-A // A=frame-5 (return address) \n"
-                                 "D=M // D holds the return address \n"
-                                 "@R14 \n"
-                                 "M=D //return address in R14 \n")
-        # *ARG = pop()                  // repositions the return value for the caller
-        self.output_stream.write("@SP \n"
-                                 "AM=M-1 \n"
-                                 "D=M //D==return value \n"
-                                 "@ARG \n"
-                                 "A=M \n"
-                                 "M=D \n")
-        # SP = ARG + 1                  // repositions SP for the caller
-        self.output_stream.write("@ARG \n"
-                                 "D=M+1 \n"
-                                 "@SP \n"
-                                 "M=D \n")
-
-        restore: str = "@R13 \n" \
-                       "AM=M-1 //A=frame-1, frame=frame-1 \n" \
-                       "D=M //D now holds the {SEG} address to restore \n" \
-                       "@{SEG} \n" \
-                       "M=D //{SEG} restored \n"
-
-        # THAT = *(frame-1)             // restores THAT for the caller
-        self.output_stream.write(restore.format(SEG="THAT"))
-        # THIS = *(frame-2)             // restores THIS for the caller
-        self.output_stream.write(restore.format(SEG="THIS"))
-        # ARG = *(frame-3)              // restores ARG for the caller
-        self.output_stream.write(restore.format(SEG="ARG"))
-        # LCL = *(frame-4)              // restores LCL for the caller
-        self.output_stream.write(restore.format(SEG="LCL"))
-        # goto return_address           // go to the return address
-        self.output_stream.write("@R14 \n"
-                                 "A=M //A armed with the return address \n"
-                                 "0;JMP \n")
+        self.spill_top()
+        if self.shared_calls:
+            self.emit(self.__templates["shared_return"].constant)
+            self.words_saved["shared calls"] += \
+                self.__templates["return"].words - self.__templates["shared_return"].words
+            return
+        self.emit(self.__templates["return"].constant)
 
     def write_boostrap(self) -> None:
-        self.output_stream.write("\n//Bootstrap: \n"
-                                 "@256 \n"
-                                 "D=A \n"
-                                 "@SP \n"
-                                 "M=D \n")
+        self.emit(self.__templates["bootstrap"].constant)
         self.write_call("Sys.init", 0)
+        if self.shared_calls:  # Sys.init never returns, so the routines are only reached by jumps
+            self.emit(self.__templates["call_routine"].constant)
+            self.emit(self.__templates["return_routine"].constant)
+            self.words_saved["shared calls"] -= \
+                self.__templates["call_routine"].words + self.__templates["return_routine"].words
+        if self.tail_calls:
+            self.emit(self.__templates["tail_call_routine"].constant)
+            self.words_saved["tail calls"] -= self.__templates["tail_call_routine"].words
+        if self.shared_compare:
+            for command in CodeWriter.COMPARE_COMMANDS:
+                routine: Template = self.__templates[command + "_routine"]
+                self.emit(routine.constant)
+                self.words_saved["shared comparisons"] -= routine.words
+
+    # Templates of the branching and function commands. The pseudo-code of
+    # each VM command is given in the Python comments.
+    FLOW_CMDS = {
+        "label": "\n({label})\n",
+        "goto": "\n@{label}\n"
+                "0;JMP\n",
+        "if_goto": "\n//if-goto command: \n"
+                   "@SP\n"
+                   "AM=M-1\n"
+                   "D=M\n"
+                   "@{label}\n"
+                   "D;JNE\n",  # TODO - is this ok? or change to actually check if -1?
+        "function": "\n//Function {FUNC_NAME}: \n"
+                    "({FUNC_NAME})\n",
+        "push_zero": "@SP \n"
+                     "AM=M+1  //SP incremented \n"
+                     "A=A-1 //A points to top of stack \n"
+                     "M=0 //local variable initialized to 0 \n",
+        "call": "\n//Function call for function {FUNC_NAME}: \n"
+                # push return_address   // generates a label and pushes it to the stack
+                "@{RETURN_LABEL}\n"
+                "D=A \n"
+                "@SP \n"
+                "AM=M+1 \n"
+                "A=A-1 \n"
+                "M=D \n"
+                # push LCL              // saves LCL of the caller
+                "@LCL \n"
+                "D=M \n"
+                "//Push D into stack: \n"
+                "@SP \n"
+                "AM = M+1 // Increased stack pointer by 1 \n"
+                "A = A-1 // A now holds the address to the top of the stack \n"
+                "M = D // Push the value \n"
+                # push ARG              // saves ARG of the caller
+                "@ARG \n"
+                "D=M \n"
+                "//Push D into stack: \n"
+                "@SP \n"
+                "AM = M+1 // Increased stack pointer by 1 \n"
+                "A = A-1 // A now holds the address to the top of the stack \n"
+                "M = D // Push the value \n"
+                # push THIS             // saves THIS of the caller
+                "@THIS \n"
+                "D=M \n"
+                "//Push D into stack: \n"
+                "@SP \n"
+                "AM = M+1 // Increased stack pointer by 1 \n"
+                "A = A-1 // A now holds the address to the top of the stack \n"
+                "M = D // Push the value \n"
+                # push THAT             // saves THAT of the caller
+                "@THAT \n"
+                "D=M \n"
+                "//Push D into stack: \n"
+                "@SP \n"
+                "AM = M+1 // Increased stack pointer by 1 \n"
+                "A = A-1 // A now holds the address to the top of the stack \n"
+                "M = D // Push the value \n"
+                # ARG = SP-5-n_args     // repositions ARG
+                "@SP \n"
+                "D=M \n"
+                "@5 \n"
+                "D=D-A //D=SP-5\n"
+                "@{N_ARGS}\n"
+                "D=D-A //SP-5-n_args \n"
+                "@ARG \n"
+                "M=D //ARG = SP-5-n_args \n"
+                # LCL = SP              // repositions LCL
+                "@SP\n"
+                "D=M\n"
+                "@LCL\n"
+                "M=D\n"
+                # goto function_name    // transfers control to the callee
+                "@{FUNC_NAME}\n"
+                "0;JMP \n"
+                # (return_address)      // injects the return address label into the code
+                "({RETURN_LABEL}) \n",
+        "return": "\n//return command: \n"
+                  # frame = LCL                   // frame is a temporary variable
+                  "@LCL \n"
+                  "D=M //D=LCL \n"
+                  "@R13 \n"
+                  "M=D // frame/LCL in R13 \n"
+                  # return_address = *(frame-5)   // puts the return address in a temp var
+                  "@5 \n"
+                  "A=D-A // A=frame-5 (return address) \n"
+                  "D=M // D holds the return address \n"
+                  "@R14 \n"
+                  "M=D //return address in R14 \n"
+                  # *ARG = pop()                  // repositions the return value for the caller
+                  "@SP \n"
+                  "AM=M-1 \n"
+                  "D=M //D==return value \n"
+                  "@ARG \n"
+                  "A=M \n"
+                  "M=D \n"
+                  # SP = ARG + 1                  // repositions SP for the caller
+                  "@ARG \n"
+                  "D=M+1 \n"
+                  "@SP \n"
+                  "M=D \n"
+                  # THAT = *(frame-1)             // restores THAT for the caller
+                  "@R13 \n"
+                  "AM=M-1 //A=frame-1, frame=frame-1 \n"
+                  "D=M //D now holds the THAT address to restore \n"
+                  "@THAT \n"
+                  "M=D //THAT restored \n"
+                  # THIS = *(frame-2)             // restores THIS for the caller
+                  "@R13 \n"
+                  "AM=M-1 //A=frame-1, frame=frame-1 \n"
+                  "D=M //D now holds the THIS address to restore \n"
+                  "@THIS \n"
+                  "M=D //THIS restored \n"
+                  # ARG = *(frame-3)              // restores ARG for the caller
+                  "@R13 \n"
+                  "AM=M-1 //A=frame-1, frame=frame-1 \n"
+                  "D=M //D now holds the ARG address to restore \n"
+                  "@ARG \n"
+                  "M=D //ARG restored \n"
+                  # LCL = *(frame-4)              // restores LCL for the caller
+                  "@R13 \n"
+                  "AM=M-1 //A=frame-1, frame=frame-1 \n"
+                  "D=M //D now holds the LCL address to restore \n"
+                  "@LCL \n"
+                  "M=D //LCL restored \n"
+                  # goto return_address           // go to the return address
+                  "@R14 \n"
+                  "A=M //A armed with the return address \n"
+                  "0;JMP \n",
+        "bootstrap": "\n//Bootstrap: \n"
+                     "@256 \n"
+                     "D=A \n"
+                     "@SP \n"
+                     "M=D \n",
+        # With shared calls, a call site only passes the number of arguments
+        # (in R13), the callee (in R14) and the return address (in D) to the
+        # $$CALL routine, and a return is a jump to the $$RETURN routine.
+        "shared_call": "\n//Function call for function {FUNC_NAME} (shared): \n"
+                       "@{N_ARGS} \n"
+                       "D=A \n"
+                       "@R13 \n"
+                       "M=D //R13 = n_args \n"
+                       "@{FUNC_NAME} \n"
+                       "D=A \n"
+                       "@R14 \n"
+                       "M=D //R14 = address of the callee \n"
+                       "@{RETURN_LABEL} \n"
+                       "D=A //D = return address \n"
+                       "@$$CALL \n"
+                       "0;JMP \n"
+                       "({RETURN_LABEL}) \n",
+        "shared_compare": "\n//{COMMAND} command (shared): \n"
+                          "@{RETURN_LABEL} \n"
+                          "D=A //D = return address \n"
+                          "@{ROUTINE} \n"
+                          "0;JMP \n"
+                          "({RETURN_LABEL}) \n",
+        "shared_return": "\n//return command (shared): \n"
+                         "@$$RETURN \n"
+                         "0;JMP \n",
+        "call_routine": "\n//Shared call routine: \n"
+                        "($$CALL) \n"
+                        # push return_address   // passed in D
+                        "@SP \n"
+                        "AM=M+1 \n"
+                        "A=A-1 \n"
+                        "M=D \n"
+                        # push LCL, ARG, THIS, THAT
+                        "@LCL \n"
+                        "D=M \n"
+                        "@SP \n"
+                        "AM=M+1 \n"
+                        "A=A-1 \n"
+                        "M=D \n"
+                        "@ARG \n"
+                        "D=M \n"
+                        "@SP \n"
+                        "AM=M+1 \n"
+                        "A=A-1 \n"
+                        "M=D \n"
+                        "@THIS \n"
+                        "D=M \n"
+                        "@SP \n"
+                        "AM=M+1 \n"
+                        "A=A-1 \n"
+                        "M=D \n"
+                        "@THAT \n"
+                        "D=M \n"
+                        "@SP \n"
+                        "AM=M+1 \n"
+                        "A=A-1 \n"
+                        "M=D \n"
+                        # ARG = SP-5-n_args     // n_args is passed in R13
+                        "@R13 \n"
+                        "D=M \n"
+                        "@5 \n"
+                        "D=D+A //D = n_args+5 \n"
+                        "@SP \n"
+                        "D=M-D \n"
+                        "@ARG \n"
+                        "M=D //ARG = SP-5-n_args \n"
+                        # LCL = SP
+                        "@SP \n"
+                        "D=M \n"
+                        "@LCL \n"
+                        "M=D \n"
+                        # goto function_name    // passed in R14
+                        "@R14 \n"
+                        "A=M \n"
+                        "0;JMP \n",
+    }
+    FLOW_CMDS["return_routine"] = "\n//Shared return routine: \n($$RETURN) \n" + FLOW_CMDS["return"]
 
     # Note - In the comments - y is the last element in the stack when the command began.
     # x is the second to last element.
@@ -490,6 +1003,386 @@ class CodeWriter:
               "M=M+1 //Set SP to next index in stack. \n"
     }
 
+    # The comparisons that can be shared, and their routines. A call site
+    # passes its return address in D, which the routine keeps in R15. Each
+    # routine uses the inline code of its command, with labels of its own.
+    COMPARE_COMMANDS = ("eq", "gt", "lt")
+    COMPARE_ROUTINES = {
+        "eq_routine": "\n//Shared eq routine: \n($$EQ) \n@R15 \nM=D //R15 = return address \n" +
+                      ARITHMETIC_COMMANDS["eq"].format(RES="$$EQ.TRUE", END="$$EQ.END") +
+                      "@R15 \nA=M \n0;JMP \n",
+        "gt_routine": "\n//Shared gt routine: \n($$GT) \n@R15 \nM=D //R15 = return address \n" +
+                      ARITHMETIC_COMMANDS["gt"].format(Y_LT_ZERO="$$GT.Y_LT_ZERO", X_LT_Y="$$GT.X_LT_Y",
+                                                       SUBTRACT="$$GT.SUBTRACT", END="$$GT.END",
+                                                       Y_LT_X="$$GT.Y_LT_X") +
+                      "@R15 \nA=M \n0;JMP \n",
+        "lt_routine": "\n//Shared lt routine: \n($$LT) \n@R15 \nM=D //R15 = return address \n" +
+                      ARITHMETIC_COMMANDS["lt"].format(Y_LT_ZERO="$$LT.Y_LT_ZERO", X_LT_Y="$$LT.X_LT_Y",
+                                                       SUBTRACT="$$LT.SUBTRACT", END="$$LT.END",
+                                                       Y_LT_X="$$LT.Y_LT_X") +
+                      "@R15 \nA=M \n0;JMP \n",
+    }
+
+    # A tail call checks whether the new arguments fit in place of the
+    # current ones (the current function's argument count is LCL-5-ARG). If
+    # they do, they are copied to ARG[0..n_args-1], the frame stays where it
+    # is, and SP is reset to LCL. Otherwise it passes the number of arguments
+    # (in R13) and the callee (in R14) to the $$TAILCALL routine, which saves
+    # the frame above the stack, copies the arguments, and moves the frame
+    # right above them.
+    TAIL_CALL_CMDS = {
+        "tail_call": "\n//Tail call for function {FUNC_NAME}: \n"
+                     "@LCL \n"
+                     "D=M \n"
+                     "@ARG \n"
+                     "D=D-M \n"
+                     "@{FRAME_SIZE} \n"
+                     "D=D-A //D==the current function's argument count - n_args \n"
+                     "@{MOVE_FRAME} \n"
+                     "D;JLT \n",
+        "tail_call_argument": "@SP \n"
+                              "D=M \n"
+                              "@{DEPTH} \n"
+                              "A=D-A \n"
+                              "D=M //D==argument {INDEX} \n"
+                              "@ARG \n"
+                              "A=M \n",
+        "tail_call_far_argument": "@SP \n"
+                                  "D=M \n"
+                                  "@{DEPTH} \n"
+                                  "A=D-A \n"
+                                  "D=M //D==argument {INDEX} \n"
+                                  "@SP \n"
+                                  "A=M \n"
+                                  "M=D //The free stack slot holds the argument \n"
+                                  "@{INDEX} \n"
+                                  "D=A \n"
+                                  "@ARG \n"
+                                  "D=D+M //D==address \n"
+                                  "@SP \n"
+                                  "A=M \n"
+                                  "D=D+M //D==address+argument \n"
+                                  "A=D-M //A==address \n"
+                                  "M=D-A //ARG[{INDEX}]==argument \n",
+        "tail_call_jump": "@LCL \n"
+                          "D=M \n"
+                          "@SP \n"
+                          "M=D //SP==LCL, the frame stays where it is \n"
+                          "@{FUNC_NAME} \n"
+                          "0;JMP \n"
+                          "({MOVE_FRAME}) \n"
+                          "@{N_ARGS} \n"
+                          "D=A \n"
+                          "@R13 \n"
+                          "M=D //R13 = n_args \n"
+                          "@{FUNC_NAME} \n"
+                          "D=A \n"
+                          "@R14 \n"
+                          "M=D //R14 = address of the callee \n"
+                          "@$$TAILCALL \n"
+                          "0;JMP \n",
+        "tail_call_routine": "\n//Shared tail call routine, for arguments that do not fit in place: \n"
+                             "($$TAILCALL) \n" +
+                             "".join("@LCL \n"
+                                     "D=M \n"
+                                     "@{} \n"
+                                     "A=D-A \n"
+                                     "D=M \n"
+                                     "@SP \n"
+                                     "A=M+1 \n"
+                                     "{}"
+                                     "M=D //RAM[SP+{}] = frame word {} \n".format(5 - word, "A=A+1 \n" * word,
+                                                                                  word + 1, word)
+                                     for word in range(5)) +
+                             # Copies the arguments in ascending order, with R15 as the index.
+                             # RAM[SP] is free, so it holds each argument while its
+                             # destination address is computed:
+                             "@R15 \n"
+                             "M=0 \n"
+                             "($$TAILCALL.COPY) \n"
+                             "@R15 \n"
+                             "D=M \n"
+                             "@R13 \n"
+                             "D=D-M \n"
+                             "@$$TAILCALL.MOVE_FRAME \n"
+                             "D;JGE //All the arguments were copied \n"
+                             "@SP \n"
+                             "D=M \n"
+                             "@R13 \n"
+                             "D=D-M //D==address of the first argument \n"
+                             "@R15 \n"
+                             "A=D+M \n"
+                             "D=M //D==argument R15 \n"
+                             "@SP \n"
+                             "A=M \n"
+                             "M=D \n"
+                             "@R15 \n"
+                             "D=M \n"
+                             "@ARG \n"
+                             "D=D+M //D==ARG+R15 \n"
+                             "@SP \n"
+                             "A=M \n"
+                             "D=D+M //D==ARG+R15+argument \n"
+                             "A=D-M //A==ARG+R15 \n"
+                             "M=D-A //ARG[R15]==argument \n"
+                             "@R15 \n"
+                             "M=M+1 \n"
+                             "@$$TAILCALL.COPY \n"
+                             "0;JMP \n"
+                             "($$TAILCALL.MOVE_FRAME) \n"
+                             "@ARG \n"
+                             "D=M \n"
+                             "@R13 \n"
+                             "D=D+M \n"
+                             "@5 \n"
+                             "D=D+A \n"
+                             "@LCL \n"
+                             "M=D //LCL==ARG+n_args+5 \n" +
+                             "".join("@SP \n"
+                                     "A=M+1 \n"
+                                     "{}"
+                                     "D=M \n"
+                                     "@LCL \n"
+                                     "A=M-1 \n"
+                                     "{}"
+                                     "M=D //frame word {} moved \n".format("A=A+1 \n" * word, "A=A-1 \n" * (4 - word),
+                                                                           word)
+                                     for word in range(5)) +
+                             "@LCL \n"
+                             "D=M \n"
+                             "@SP \n"
+                             "M=D //SP==LCL \n"
+                             "@R14 \n"
+                             "A=M \n"
+                             "0;JMP \n",
+    }
+
+    # Candidate push and pop sequences of specialized segments (see
+    # __specialize). They are all filled in when the table is built, and
+    # "pop_far" also serves the indexes out of the table (as "pop_direct").
+    SPECIALIZED_CMDS = {
+        "push_far": "\n//push {segment} {index} (specialized): \n"
+                    "@{index} \n"
+                    "D=A \n"
+                    "@{segment_code} \n"
+                    "A=D+M \n"
+                    "D=M \n"
+                    "@SP \n"
+                    "AM=M+1 \n"
+                    "A=A-1 \n"
+                    "M=D \n",
+        "push_walk": "\n//push {segment} {index} (specialized): \n"
+                     "@{segment_code} \n"
+                     "A=M \n"
+                     "{increments}"
+                     "D=M \n"
+                     "@SP \n"
+                     "AM=M+1 \n"
+                     "A=A-1 \n"
+                     "M=D \n",
+        "push_walk_plus_one": "\n//push {segment} {index} (specialized): \n"
+                              "@{segment_code} \n"
+                              "A=M+1 \n"
+                              "{more_increments}"
+                              "D=M \n"
+                              "@SP \n"
+                              "AM=M+1 \n"
+                              "A=A-1 \n"
+                              "M=D \n",
+        "pop_far": "\n//pop {segment} {index} (specialized): \n"
+                   "@{index} \n"
+                   "D=A \n"
+                   "@{segment_code} \n"
+                   "D=D+M //D==address \n"
+                   "@SP \n"
+                   "AM=M-1 //M==value \n"
+                   "D=D+M //D==address+value \n"
+                   "A=D-M //A==address \n"
+                   "M=D-A //RAM[address]==value \n",
+        "pop_walk": "\n//pop {segment} {index} (specialized): \n"
+                    "@SP \n"
+                    "AM=M-1 \n"
+                    "D=M \n"
+                    "@{segment_code} \n"
+                    "A=M \n"
+                    "{increments}"
+                    "M=D \n",
+        "pop_walk_plus_one": "\n//pop {segment} {index} (specialized): \n"
+                             "@SP \n"
+                             "AM=M-1 \n"
+                             "D=M \n"
+                             "@{segment_code} \n"
+                             "A=M+1 \n"
+                             "{more_increments}"
+                             "M=D \n",
+        "push_fixed": "\n//push {segment} {index} (specialized): \n"
+                      "@{address} \n"
+                      "D=M \n"
+                      "@SP \n"
+                      "AM=M+1 \n"
+                      "A=A-1 \n"
+                      "M=D \n",
+        "pop_fixed": "\n//pop {segment} {index} (specialized): \n"
+                     "@SP \n"
+                     "AM=M-1 \n"
+                     "D=M \n"
+                     "@{address} \n"
+                     "M=D \n",
+        "push_constant": "\n//push constant {index} (specialized): \n"
+                         "@{index} \n"
+                         "D=A \n"
+                         "@SP \n"
+                         "AM=M+1 \n"
+                         "A=A-1 \n"
+                         "M=D \n",
+        "push_small_constant": "\n//push constant {index} (specialized): \n"
+                               "@SP \n"
+                               "AM=M+1 \n"
+                               "A=A-1 \n"
+                               "M={index} \n",
+    }
+
+    # Compact initializations of the locals of a function.
+    LOCALS_CMDS = {
+        "allocate_local": "@SP \n"
+                          "M=M+1 //Local 0 is written before it is read \n",
+        "allocate_locals": "@{N_VARS} \n"
+                           "D=A \n"
+                           "@SP \n"
+                           "M=D+M //Locals are written before they are read \n",
+        "zero_first_local": "@SP \n"
+                            "A=M \n"
+                            "M=0 //local variables initialized to 0 \n",
+        "zero_next_local": "A=A+1 \n"
+                           "M=0 \n",
+        "zero_locals_end": "D=A+1 \n"
+                           "@SP \n"
+                           "M=D //SP after the locals \n",
+        "zero_locals_loop": "@{N_VARS} \n"
+                            "D=A //D==locals left to initialize \n"
+                            "({LOOP}) \n"
+                            "@SP \n"
+                            "AM=M+1 \n"
+                            "A=A-1 \n"
+                            "M=0 \n"
+                            "D=D-1 \n"
+                            "@{LOOP} \n"
+                            "D;JGT \n",
+    }
+
+    # Templates of the cached top of stack mode. While the top of the stack is
+    # cached, its value is in D and SP points to where it would be stored.
+    CACHED_CMDS = {
+        "spill": "//Spill the cached top of stack: \n"
+                 "@SP \n"
+                 "AM=M+1 \n"
+                 "A=A-1 \n"
+                 "M=D \n",
+        "load_top": "@SP \n"
+                    "AM=M-1 \n"
+                    "D=M //D==top of stack, now cached \n",
+        "push_constant": "\n//push constant {index} (cached): \n"
+                         "@{index} \n"
+                         "D=A \n",
+        "push_small_constant": "\n//push constant {index} (cached): \n"
+                               "D={index} \n",
+        "push_segment": "\n//push {segment} {index} (cached): \n"
+                        "@{index} \n"
+                        "D=A \n"
+                        "@{segment_code} \n"
+                        "A=D+M \n"
+                        "D=M \n",
+        "push_segment_0": "\n//push {segment} 0 (cached): \n"
+                          "@{segment_code} \n"
+                          "A=M \n"
+                          "D=M \n",
+        "push_segment_1": "\n//push {segment} 1 (cached): \n"
+                          "@{segment_code} \n"
+                          "A=M+1 \n"
+                          "D=M \n",
+        "push_address": "\n//push {segment} {index} (cached): \n"
+                        "@{address} \n"
+                        "D=M \n",
+        "pop_address": "\n//pop {segment} {index} (cached): \n"
+                       "@{address} \n"
+                       "M=D \n",
+        "pop_segment_near": "\n//pop {segment} {index} (cached): \n"
+                            "@{segment_code} \n"
+                            "A=M \n",
+        "increment_A": "A=A+1 \n",
+        "store_D": "M=D \n",
+        "pop_segment_far": "\n//pop {segment} {index} (cached): \n"
+                           "@SP \n"
+                           "A=M \n"
+                           "M=D //The free stack slot holds the value \n"
+                           "@{index} \n"
+                           "D=A \n"
+                           "@{segment_code} \n"
+                           "D=D+M //D==address \n"
+                           "@SP \n"
+                           "A=M \n"
+                           "D=D+M //D==address+value \n"
+                           "A=D-M //A==address \n"
+                           "M=D-A //RAM[address]==value \n",
+        "binary": "\n//{command} (cached): \n"
+                  "@SP \n"
+                  "AM=M-1 //A armed with x's address \n"
+                  "D={computation} \n",
+        "unary": "\n//{command} (cached): \n"
+                 "D={computation} \n",
+        "cached_if_goto": "\n//if-goto command (cached): \n"
+                          "@{label} \n"
+                          "D;JNE \n",
+    }
+    # The arithmetic commands that are computed in D, with a cached top of
+    # stack (y, or the only operand) in D and x in RAM.
+    CACHED_COMPUTATIONS = {
+        "add": "D+M",
+        "sub": "M-D",
+        "and": "D&M",
+        "or": "D|M",
+        "neg": "-D",
+        "not": "!D",
+        "shiftleft": "D<<",
+        "shiftright": "D>>",
+    }
+    UNARY_COMMANDS = {"neg", "not", "shiftleft", "shiftright"}
+
+    # Pieces of the fused commands of the peephole optimizer (see write_fused).
+    FUSED_CMDS = {
+        "fused": "\n//{rule} {values} (fused): \n",
+        "address": "@{index} \n"
+                   "D=A \n"
+                   "@{segment_code} \n"
+                   "A=D+M //A==segment_address+index \n",
+        "address_0": "@{segment_code} \n"
+                     "A=M \n",
+        "address_1": "@{segment_code} \n"
+                     "A=M+1 \n",
+        "address_fixed": "@{address} \n",
+        "constant": "@{index} \n"
+                    "D=A \n",
+        "small_constant": "D={index} \n",
+        "load_M": "D=M \n",
+        "update": "M={computation} \n",
+        "update_top": "@SP \n"
+                      "A=M-1 //A armed with x's address \n"
+                      "M={computation} \n",
+        "save_address": "D=A \n"
+                        "@R13 \n"
+                        "M=D //R13==target address \n",
+        "store_saved": "@R13 \n"
+                       "A=M \n"
+                       "M=D \n",
+    }
+    # The binary operations of fused commands, with y in D and x in RAM.
+    FUSED_COMPUTATIONS = {
+        "add": "D+M",
+        "sub": "M-D",
+        "and": "D&M",
+        "or": "D|M",
+    }
+
     SEGMENT_CODES = {
         "local": "LCL",
         "argument": "ARG",
@@ -587,3 +1480,4 @@ class CodeWriter:
                                "@SP \n"
                                "M=M-1 \n"
     }
+    PUSH_POP_CMDS["pop_direct"] = SPECIALIZED_CMDS["pop_far"]
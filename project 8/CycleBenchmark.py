@@ -0,0 +1,196 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import typing
+
+TRANSLATOR_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Main.py")
+ASSEMBLER_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "project 6")
+sys.path.append(ASSEMBLER_DIRECTORY)
+from Code import COMPUTATION_DICT  # noqa: E402 - the assembler's encoding of the ALU computations
+
+DEFAULT_MAX_CYCLES = 50000000
+# The program is done when it reaches this function, or a label of a copy of
+# it that the translator inlined.
+HALT_FUNCTION = "Sys.halt"
+HALT_INLINED = "$inline." + HALT_FUNCTION + "."
+# RAM that holds the same values whatever the calling conventions are: the
+# heap (the stack and the temporary registers may differ between
+# translations). Static variables are compared by name, since the assembler
+# allocates them in order of appearance, which may change too.
+COMPARED_RAM = (range(2048, 16384),)
+PREDEFINED_SYMBOLS = {"SP", "LCL", "ARG", "THIS", "THAT", "SCREEN", "KBD"} | {"R{}".format(i) for i in range(16)}
+
+COMPUTATIONS: typing.Dict[str, typing.Callable[[int, int, int], int]] = {
+    "0": lambda a, d, m: 0,
+    "1": lambda a, d, m: 1,
+    "-1": lambda a, d, m: -1,
+    "D": lambda a, d, m: d,
+    "A": lambda a, d, m: a,
+    "M": lambda a, d, m: m,
+    "!D": lambda a, d, m: ~d,
+    "!A": lambda a, d, m: ~a,
+    "!M": lambda a, d, m: ~m,
+    "-D": lambda a, d, m: -d,
+    "-A": lambda a, d, m: -a,
+    "-M": lambda a, d, m: -m,
+    "D+1": lambda a, d, m: d + 1,
+    "A+1": lambda a, d, m: a + 1,
+    "M+1": lambda a, d, m: m + 1,
+    "D-1": lambda a, d, m: d - 1,
+    "A-1": lambda a, d, m: a - 1,
+    "M-1": lambda a, d, m: m - 1,
+    "D+A": lambda a, d, m: d + a,
+    "D+M": lambda a, d, m: d + m,
+    "D-A": lambda a, d, m: d - a,
+    "D-M": lambda a, d, m: d - m,
+    "A-D": lambda a, d, m: a - d,
+    "M-D": lambda a, d, m: m - d,
+    "D&A": lambda a, d, m: d & a,
+    "D&M": lambda a, d, m: d & m,
+    "D|A": lambda a, d, m: d | a,
+    "D|M": lambda a, d, m: d | m,
+    "A<<": lambda a, d, m: a << 1,
+    "D<<": lambda a, d, m: d << 1,
+    "M<<": lambda a, d, m: m << 1,
+    "A>>": lambda a, d, m: (a - 0x10000 if a & 0x8000 else a) >> 1,
+    "D>>": lambda a, d, m: (d - 0x10000 if d & 0x8000 else d) >> 1,
+    "M>>": lambda a, d, m: (m - 0x10000 if m & 0x8000 else m) >> 1,
+}
+# The 9 bits of a C-instruction that select the computation -> its mnemonic.
+COMPUTATION_BITS = {int(bits, 2): mnemonic for mnemonic, bits in COMPUTATION_DICT.items()}
+
+
+def run(words: typing.Sequence[int], halt_addresses: typing.AbstractSet[int],
+        max_cycles: int = DEFAULT_MAX_CYCLES) -> typing.Tuple[int, bool, typing.List[int]]:
+    """Runs a program on a simulated Hack computer.
+
+    Args:
+        words (typing.Sequence[int]): the machine words of the program.
+        halt_addresses (typing.AbstractSet[int]): the program is done when it
+            reaches one of these ROM addresses.
+        max_cycles (int): stops the program after this many instructions.
+
+    Returns:
+        typing.Tuple[int, bool, typing.List[int]]: the number of executed
+        instructions, whether the program reached a halt address, and the
+        final content of the RAM.
+    """
+    program = list()
+    for word in words:
+        if not word & 0x8000:
+            program.append((word, None, 0, 0))
+        else:
+            program.append((None, COMPUTATIONS[COMPUTATION_BITS[(word >> 6) & 0x1FF]], (word >> 3) & 7, word & 7))
+    ram = [0] * 32768
+    a = d = pc = cycles = 0
+    while cycles < max_cycles and pc not in halt_addresses:
+        value, computation, dest, jump = program[pc]
+        cycles += 1
+        if computation is None:
+            a = value
+            pc += 1
+            continue
+        out = computation(a, d, ram[a & 0x7FFF]) & 0xFFFF
+        if dest & 1:
+            ram[a & 0x7FFF] = out
+        target = a
+        if dest & 2:
+            d = out
+        if dest & 4:
+            a = out
+        if jump and ((jump & 4 and out & 0x8000) or (jump & 2 and out == 0) or
+                     (jump & 1 and out and not out & 0x8000)):
+            pc = target
+        else:
+            pc += 1
+    return cycles, pc in halt_addresses, ram
+
+
+def build(vm_directory: str, options: typing.List[str]) -> typing.Tuple[typing.List[int], typing.Set[int],
+                                                                       typing.Dict[str, int]]:
+    """Translates and assembles the .vm files of a directory.
+
+    Args:
+        vm_directory (str): a directory of .vm files.
+        options (typing.List[str]): options for the VM translator.
+
+    Returns:
+        typing.Tuple[typing.List[int], typing.Set[int], typing.Dict[str, int]]:
+        the machine words of the program, the ROM addresses of HALT_FUNCTION
+        and of its inlined copies (empty if the program has no such
+        function), and the RAM address of every variable.
+    """
+    with tempfile.TemporaryDirectory() as work_directory:
+        program_directory = os.path.join(work_directory, "Program")
+        os.mkdir(program_directory)
+        for filename in os.listdir(vm_directory):
+            if os.path.splitext(filename)[1].lower() == ".vm":
+                shutil.copy(os.path.join(vm_directory, filename), program_directory)
+        asm_path = os.path.join(program_directory, "Program.asm")
+        subprocess.run([sys.executable, TRANSLATOR_PATH] + options + [program_directory], check=True)
+        subprocess.run([sys.executable, os.path.join(ASSEMBLER_DIRECTORY, "Main.py"), asm_path], check=True)
+        with open(os.path.splitext(asm_path)[0] + ".hack", 'r') as hack_file:
+            words = [int(line, 2) for line in hack_file.read().split()]
+        halt_addresses = set()
+        address = 0
+        labels = set()
+        symbols: typing.Dict[str, None] = dict()  # In order of first appearance
+        with open(asm_path, 'r') as asm_file:
+            for line in asm_file:
+                line = "".join(line.split("//")[0].split())
+                if line == "(" + HALT_FUNCTION + ")" or (line.startswith("(") and HALT_INLINED in line):
+                    halt_addresses.add(address)
+                if line.startswith("("):
+                    labels.add(line[1:-1])
+                elif line:
+                    address += 1
+                    if line.startswith("@") and not line[1:].isnumeric():
+                        symbols.setdefault(line[1:])
+    variables = [symbol for symbol in symbols if symbol not in labels and symbol not in PREDEFINED_SYMBOLS]
+    return words, halt_addresses, {variable: 16 + index for index, variable in enumerate(variables)}
+
+
+if "__main__" == __name__:
+    # Translates the .vm files of the given directory twice, with the default
+    # translator options and with the given ones, runs both programs until
+    # they reach Sys.halt, and compares their ROM size and cycle count.
+    # Options:
+    #   --max-cycles=N: stop each program after N instructions.
+    #   Any other option is passed to the VM translator.
+    usage = "Invalid usage, please use: CycleBenchmark.py [--max-cycles=N] <vm directory> [translator options]"
+    arguments = [argument for argument in sys.argv[1:] if not argument.startswith("--")]
+    max_cycles_options = [argument for argument in sys.argv[1:] if argument.startswith("--max-cycles=")]
+    translator_options = [argument for argument in sys.argv[1:]
+                          if argument.startswith("--") and argument not in max_cycles_options]
+    if not len(arguments) == 1 or not os.path.isdir(arguments[0]):
+        sys.exit(usage)
+    max_cycles = DEFAULT_MAX_CYCLES
+    if max_cycles_options:
+        if not max_cycles_options[-1].partition("=")[2].isnumeric():
+            sys.exit(usage)
+        max_cycles = int(max_cycles_options[-1].partition("=")[2])
+
+    results = list()
+    for name, build_options in (("default", []), (" ".join(translator_options) or "default", translator_options)):
+        program_words, program_halt, program_variables = build(arguments[0], build_options)
+        program_cycles, program_halted, program_ram = run(program_words, program_halt, max_cycles)
+        results.append((name, len(program_words), program_cycles, program_ram, program_variables))
+        print("{:<40} {:>8} words {:>12} cycles{}".format(name, len(program_words), program_cycles,
+                                                          "" if program_halted else " (did not halt)"))
+    (_, base_words, base_cycles, base_ram, base_variables), (_, words_, cycles_, ram_, variables_) = results
+    print("{:<40} {:>+8} words {:>+12} cycles".format("difference", words_ - base_words, cycles_ - base_cycles))
+    same_ram = all(base_ram[address] == ram_[address] for addresses in COMPARED_RAM for address in addresses)
+    same_ram = same_ram and all(base_ram[base_variables[variable]] == ram_[variables_[variable]]
+                                for variable in base_variables.keys() & variables_.keys())
+    print("statics and heap {}".format("identical" if same_ram else "DIFFER"))
+    if not same_ram:
+        sys.exit(1)
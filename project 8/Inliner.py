@@ -0,0 +1,221 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import collections
+import typing
+from LocalsAnalyzer import LocalsAnalyzer
+from Parser import CommandType, VMCommand
+
+# The most ROM words that inlining a function may add at each call site: the
+# words of the inlined body, minus those of the call it replaces. A call site
+# always saves the cycles of a call and a return, so by default a function is
+# inlined whenever that does not make the program larger.
+DEFAULT_BUDGET = 0
+# The pseudo-file whose static variables hold the arguments, locals and saved
+# pointers of the inlined function that is running. Only functions that call
+# no other function are inlined, so two inlined bodies never run at once and
+# can all share these variables.
+SCRATCH_FILE = "$$INLINE"
+BINARY_COMMANDS = {"add", "sub", "and", "or", "eq", "gt", "lt"}
+
+
+class Inliner:
+    """Replaces calls to small functions with the body of the function, when
+    the inlined body takes at most the budget more ROM words than the call.
+
+    Only functions that make no calls themselves are inlined, which rules out
+    recursion, and only if they return and their stack is balanced: every
+    return must leave exactly the return value on the function's working
+    stack. At the call
+    site, the arguments are popped into SCRATCH_FILE static variables, and
+    the body's argument and local segments are remapped to them. Static
+    variables keep referring to the callee's file, labels are renamed to be
+    unique at every call site, and if the body changes THIS or THAT, they are
+    saved before it and restored at every return, as a real return would.
+    Locals are zeroed first, unless the body writes each of them before it
+    reads it.
+    """
+
+    def __init__(self, code_size: typing.Callable[[typing.Iterable[VMCommand]], int],
+                 budget: int = DEFAULT_BUDGET) -> None:
+        """
+        Args:
+            code_size (typing.Callable[[typing.Iterable[VMCommand]], int]):
+                the number of ROM words that commands are translated into.
+            budget (int): the most ROM words inlining may add at a call site.
+        """
+        self.__code_size = code_size
+        self.__budget = budget
+        # Function name -> (file name, number of locals, body):
+        self.__functions: typing.Dict[str, typing.Tuple[str, int, typing.List[VMCommand]]] = dict()
+        # Function name -> None if it is inlined, why it is not otherwise:
+        self.__decisions: typing.Dict[str, typing.Optional[str]] = dict()
+        # Function name -> ROM words of its inlined body and of a call to it:
+        self.__sizes: typing.Dict[str, typing.Tuple[int, int]] = dict()
+        self.__sites = 0
+        self.calls: typing.Counter[str] = collections.Counter()
+        self.inlined: typing.Counter[str] = collections.Counter()
+
+    def add_file(self, file_name: str, commands: typing.Iterable[VMCommand]) -> None:
+        """Reads the functions of a file. Must be called for every file before
+        any of them is expanded.
+
+        Args:
+            file_name (str): the name of the file, without its extension.
+            commands (typing.Iterable[VMCommand]): the commands of the file.
+        """
+        body: typing.List[VMCommand] = list()  # Commands before the first function are never inlined
+        for command in commands:
+            if command.kind == CommandType.C_FUNCTION:
+                body = list()
+                self.__functions[command.arg1] = (file_name, command.arg2, body)
+            else:
+                body.append(command)
+
+    def inlines(self, function_name: str, n_args: int) -> bool:
+        """
+        Args:
+            function_name (str): the name of a function.
+            n_args (int): the number of arguments it is called with.
+
+        Returns:
+            bool: True if calls to the function are replaced with its body.
+        """
+        if function_name not in self.__decisions:
+            self.__decisions[function_name] = self.__decide(function_name, n_args)
+        return self.__decisions[function_name] is None
+
+    def __decide(self, function_name: str, n_args: int) -> typing.Optional[str]:
+        if function_name not in self.__functions:
+            return "not defined"
+        _, _, body = self.__functions[function_name]
+        if any(command.kind == CommandType.C_CALL for command in body):
+            return "calls other functions"
+        if all(command.kind != CommandType.C_RETURN for command in body):
+            return "never returns"
+        if not Inliner.__balanced(body):
+            return "unbalanced stack at return"
+        inlined_words = self.__code_size(self.__expand_call(function_name, n_args, ""))
+        call_words = self.__code_size([VMCommand(CommandType.C_CALL, function_name, n_args)])
+        self.__sizes[function_name] = (inlined_words, call_words)
+        if inlined_words - call_words > self.__budget:
+            return "{} words inlined against a {}-word call, over the budget of {}".format(
+                inlined_words, call_words, self.__budget)
+        return None
+
+    @staticmethod
+    def __balanced(body: typing.List[VMCommand]) -> bool:
+        # Follows the depth of the working stack through the body. A label
+        # must be reached at the same depth from everywhere, and every return
+        # must leave exactly one value.
+        depth: typing.Optional[int] = 0  # None after a goto or a return, until the next label
+        label_depths: typing.Dict[str, typing.Optional[int]] = dict()
+        for command in body:
+            kind = command.kind
+            if kind == CommandType.C_LABEL:
+                recorded = label_depths.setdefault(command.arg1, depth)
+                if recorded is None or (depth is not None and depth != recorded):
+                    return False
+                depth = recorded
+                continue
+            if depth is None:  # Dead code
+                continue
+            if kind == CommandType.C_PUSH:
+                depth += 1
+            elif kind == CommandType.C_POP or (kind == CommandType.C_ARITHMETIC and command.arg1 in BINARY_COMMANDS):
+                depth -= 1
+            elif kind == CommandType.C_IF or kind == CommandType.C_GOTO:
+                depth -= 1 if kind == CommandType.C_IF else 0
+                if depth < 0 or label_depths.setdefault(command.arg1, depth) != depth:
+                    return False
+                depth = None if kind == CommandType.C_GOTO else depth
+            elif kind == CommandType.C_RETURN:
+                if depth != 1:
+                    return False
+                depth = None
+            if depth is not None and depth < 0:
+                return False
+        return depth is None  # A body never falls off its end
+
+    def expand(self, commands: typing.Iterable[VMCommand]) -> typing.Iterator[VMCommand]:
+        """Lazily replaces the calls to inlined functions with their bodies.
+
+        Args:
+            commands (typing.Iterable[VMCommand]): the commands of a file.
+
+        Yields:
+            VMCommand: the commands, with inlined calls expanded.
+        """
+        for command in commands:
+            if command.kind != CommandType.C_CALL:
+                yield command
+                continue
+            self.calls[command.arg1] += 1
+            if not self.inlines(command.arg1, command.arg2):
+                yield command
+                continue
+            self.inlined[command.arg1] += 1
+            # Makes the labels of every call site unique, and tells which function they came from:
+            suffix = "$inline.{}.{}".format(command.arg1, self.__sites)
+            self.__sites += 1
+            yield from self.__expand_call(command.arg1, command.arg2, suffix)
+
+    def __expand_call(self, function_name: str, n_args: int, suffix: str) -> typing.Iterator[VMCommand]:
+        file_name, n_vars, body = self.__functions[function_name]
+        end_label = "end" + suffix
+        saved_pointers = sorted({command.arg2 for command in body
+                                 if command.kind == CommandType.C_POP and command.arg1 == "pointer"})
+        pointer_slots = {index: n_args + n_vars + offset for offset, index in enumerate(saved_pointers)}
+        for index in reversed(range(n_args)):
+            yield VMCommand(CommandType.C_POP, "static", index, SCRATCH_FILE)
+        for index in range(0 if LocalsAnalyzer.written_before_read(body) else n_vars):
+            yield VMCommand(CommandType.C_PUSH, "constant", 0)
+            yield VMCommand(CommandType.C_POP, "static", n_args + index, SCRATCH_FILE)
+        for index, slot in pointer_slots.items():
+            yield VMCommand(CommandType.C_PUSH, "pointer", index)
+            yield VMCommand(CommandType.C_POP, "static", slot, SCRATCH_FILE)
+        jumps_to_end = False
+        for position, command in enumerate(body):
+            kind = command.kind
+            if kind == CommandType.C_PUSH or kind == CommandType.C_POP:
+                if command.arg1 == "argument":
+                    yield VMCommand(kind, "static", command.arg2, SCRATCH_FILE)
+                elif command.arg1 == "local":
+                    yield VMCommand(kind, "static", n_args + command.arg2, SCRATCH_FILE)
+                elif command.arg1 == "static":
+                    yield VMCommand(kind, "static", command.arg2, command.static_file or file_name)
+                else:
+                    yield command
+            elif kind == CommandType.C_LABEL or kind == CommandType.C_GOTO or kind == CommandType.C_IF:
+                yield VMCommand(kind, command.arg1 + suffix)
+            elif kind == CommandType.C_RETURN:
+                for index, slot in pointer_slots.items():
+                    yield VMCommand(CommandType.C_PUSH, "static", slot, SCRATCH_FILE)
+                    yield VMCommand(CommandType.C_POP, "pointer", index)
+                if position < len(body) - 1:
+                    jumps_to_end = True
+                    yield VMCommand(CommandType.C_GOTO, end_label)
+            else:
+                yield command
+        if jumps_to_end:
+            yield VMCommand(CommandType.C_LABEL, end_label)
+
+    def report(self) -> str:
+        """
+        Returns:
+            str: the decision about every called function, one per line.
+        """
+        lines = list()
+        for function_name in sorted(self.calls):
+            reason = self.__decisions.get(function_name)
+            if reason is None:
+                inlined_words, call_words = self.__sizes[function_name]
+                lines.append("{}: inlined at {} call sites ({:+} words each, against a {}-word call)".format(
+                    function_name, self.inlined[function_name], inlined_words - call_words, call_words))
+            else:
+                lines.append("{}: not inlined ({})".format(function_name, reason))
+        return "\n".join(lines)
@@ -0,0 +1,131 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import typing
+from Parser import CommandType, VMCommand
+from PeepholeOptimizer import FusedCommand
+
+
+class LocalsAnalyzer:
+    """Finds the functions whose local variables need not be initialized to 0,
+    because on every path through the function, each local is popped into
+    before it is pushed. Locals can only be reached through the local segment
+    (no VM command exposes LCL), so this is all it takes. Commands fused by
+    the peephole optimizer are understood too: they read the local they push
+    (S, I) and write the local they pop into (T, J, or S, I for increment).
+    """
+
+    def __init__(self) -> None:
+        self.uninitialized: typing.Set[str] = set()
+
+    def analyze(self, commands: typing.Iterable[VMCommand]) -> typing.Iterator[VMCommand]:
+        """Lazily passes the commands on, holding back one function at a time,
+        so that a function is analyzed before its function command is
+        translated.
+
+        Args:
+            commands (typing.Iterable[VMCommand]): the commands of a file.
+
+        Yields:
+            VMCommand: the same commands. When a function command is yielded,
+            the function is already in uninitialized if its locals need no
+            initialization.
+        """
+        function: typing.Optional[VMCommand] = None
+        body: typing.List[VMCommand] = list()
+        for command in commands:
+            if command.kind == CommandType.C_FUNCTION:
+                yield from self.__flush(function, body)
+                function, body = command, list()
+            elif function is None:
+                yield command
+            else:
+                body.append(command)
+        yield from self.__flush(function, body)
+
+    def __flush(self, function: typing.Optional[VMCommand],
+                body: typing.List[VMCommand]) -> typing.Iterator[VMCommand]:
+        if function is None:
+            return
+        if function.arg2 and LocalsAnalyzer.written_before_read(body):
+            self.uninitialized.add(function.arg1)
+        yield function
+        yield from body
+
+    @staticmethod
+    def local_reads(command: VMCommand) -> typing.Set[int]:
+        """
+        Args:
+            command (VMCommand): a command.
+
+        Returns:
+            typing.Set[int]: the locals the command reads.
+        """
+        if command.kind == CommandType.C_PUSH:
+            return {command.arg2} if command.arg1 == "local" else set()
+        if isinstance(command, FusedCommand):
+            return {int(command.values["I"])} if command.values.get("S") == "local" else set()
+        return set()
+
+    @staticmethod
+    def local_writes(command: VMCommand) -> typing.Set[int]:
+        """
+        Args:
+            command (VMCommand): a command.
+
+        Returns:
+            typing.Set[int]: the locals the command writes.
+        """
+        if command.kind == CommandType.C_POP:
+            return {command.arg2} if command.arg1 == "local" else set()
+        if isinstance(command, FusedCommand):
+            if command.arg1 == "increment":
+                return {int(command.values["I"])} if command.values["S"] == "local" else set()
+            return {int(command.values["J"])} if command.values.get("T") == "local" else set()
+        return set()
+
+    @staticmethod
+    def written_before_read(body: typing.List[VMCommand]) -> bool:
+        """A must-write dataflow analysis: the locals written on every path to
+        a command are the intersection of those written on the paths to each
+        of its predecessors.
+
+        Args:
+            body (typing.List[VMCommand]): the commands of a function, without
+                its function command.
+
+        Returns:
+            bool: True if no local is ever read before it is written.
+        """
+        labels = {command.arg1: index for index, command in enumerate(body) if command.kind == CommandType.C_LABEL}
+        successors: typing.List[typing.List[int]] = list()
+        for index, command in enumerate(body):
+            following = list()
+            if command.kind != CommandType.C_GOTO and command.kind != CommandType.C_RETURN:
+                following.append(index + 1)
+            if command.kind == CommandType.C_GOTO or command.kind == CommandType.C_IF:
+                if command.arg1 not in labels:
+                    return False  # A jump out of the function, which is never valid
+                following.append(labels[command.arg1])
+            successors.append([successor for successor in following if successor < len(body)])
+
+        # written[i] is None until a path to command i is found:
+        written: typing.List[typing.Optional[typing.FrozenSet[int]]] = [None] * len(body)
+        if body:
+            written[0] = frozenset()
+        pending = [0] if body else []
+        while pending:
+            index = pending.pop()
+            command = body[index]
+            after = written[index] | LocalsAnalyzer.local_writes(command)
+            for successor in successors[index]:
+                merged = after if written[successor] is None else written[successor] & after
+                if merged != written[successor]:
+                    written[successor] = merged
+                    pending.append(successor)
+        return all(written[index] is None or LocalsAnalyzer.local_reads(command) <= written[index]
+                   for index, command in enumerate(body))
@@ -5,15 +5,106 @@ was written by Aviv Yaish. It is an extension to the specifications given
 as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
 Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
+import collections
+import functools
+import io
 import os
 import sys
 import typing
-from Parser import Parser
-from CodeWriter import CodeWriter
+from Parser import Parser, CommandType, VMCommand
+from CodeWriter import CodeWriter, count_words
+from Inliner import Inliner
+from LocalsAnalyzer import LocalsAnalyzer
+from PeepholeOptimizer import PeepholeOptimizer
+from TreeShaker import TreeShaker
+
+
+def write_commands(code_writer: CodeWriter, commands: typing.Iterable[VMCommand],
+                   uninitialized: typing.AbstractSet[str] = frozenset()) -> None:
+    """Translates commands with a code writer.
+
+    Args:
+        code_writer (CodeWriter): writes the translation.
+        commands (typing.Iterable[VMCommand]): the commands to translate.
+        uninitialized (typing.AbstractSet[str]): functions whose locals need
+            not be initialized to 0 (may be filled while the commands are
+            iterated).
+    """
+    for command in commands:
+        command_type = command.kind
+        if command_type == CommandType.C_ARITHMETIC:
+            code_writer.write_arithmetic(command.arg1)  # arg1 is the command itself
+        elif command_type == CommandType.C_PUSH or command_type == CommandType.C_POP:
+            code_writer.write_push_pop(command_type, command.arg1, command.arg2, command.static_file)
+        elif command_type == CommandType.C_LABEL:
+            code_writer.write_label(command.arg1)
+        elif command_type == CommandType.C_GOTO:
+            code_writer.write_goto(command.arg1)
+        elif command_type == CommandType.C_IF:
+            code_writer.write_if(command.arg1)
+        elif command_type == CommandType.C_FUNCTION:
+            code_writer.write_function(command.arg1, command.arg2, command.arg1 not in uninitialized)
+        elif command_type == CommandType.C_RETURN:
+            code_writer.write_return()
+        elif command_type == CommandType.C_CALL:
+            code_writer.write_call(command.arg1, command.arg2)
+        elif command_type == CommandType.C_FUSED:
+            code_writer.write_fused(command.arg1, command.values)
+        elif command_type == CommandType.C_TAIL_CALL:
+            code_writer.write_tail_call(command.arg1, command.arg2)
+    code_writer.spill_top()
+
+
+def translated_words(commands: typing.Iterable[VMCommand], **options: bool) -> int:
+    """
+    Args:
+        commands (typing.Iterable[VMCommand]): commands to translate.
+        **options (bool): options for the code writer (e.g. cache_top).
+
+    Returns:
+        int: the number of ROM words the commands are translated into.
+    """
+    code = io.StringIO()
+    code_writer = CodeWriter(code, False, **options)
+    write_commands(code_writer, commands)
+    code_writer.flush()
+    return count_words(code.getvalue())
+
+
+def find_tail_calls(commands: typing.Iterable[VMCommand]) -> typing.Iterator[VMCommand]:
+    """Lazily replaces every call that is immediately followed by a return
+    with a single C_TAIL_CALL command.
+
+    Args:
+        commands (typing.Iterable[VMCommand]): the commands of a file.
+
+    Yields:
+        VMCommand: the commands, with tail calls merged.
+    """
+    pending: typing.Optional[VMCommand] = None  # A call, until the next command is known
+    for command in commands:
+        if pending is not None:
+            if command.kind == CommandType.C_RETURN:
+                yield VMCommand(CommandType.C_TAIL_CALL, pending.arg1, pending.arg2)
+                pending = None
+                continue
+            yield pending
+            pending = None
+        if command.kind == CommandType.C_CALL:
+            pending = command
+        else:
+            yield command
+    if pending is not None:
+        yield pending
 
 
 def translate_file(
-        input_file: typing.TextIO, output_file: typing.TextIO, bootstrap: bool) -> None:
+        input_file: typing.TextIO, output_file: typing.TextIO, bootstrap: bool, comments: bool = True,
+        shared_calls: bool = False, shared_compare: bool = False, cache_top: bool = False,
+        peephole: typing.Optional[PeepholeOptimizer] = None,
+        tree_shaker: typing.Optional[TreeShaker] = None,
+        inliner: typing.Optional[Inliner] = None, tail_calls: bool = False,
+        compact_locals: bool = False, specialize_segments: bool = False) -> typing.Counter[str]:
     """Translates a single file.
 
     Args:
@@ -21,49 +112,72 @@ def translate_file(
         output_file (typing.TextIO): writes all output to this file.
         bootstrap (bool): if this is True, the current file is the
             first file we are translating.
+        comments (bool): if False, no comments are written to the output.
+        shared_calls (bool): if True, calls and returns jump to shared
+            routines instead of being inlined (see CodeWriter).
+        shared_compare (bool): if True, eq, gt and lt jump to shared routines
+            instead of being inlined.
+        cache_top (bool): if True, keeps the top of the stack in D between
+            commands.
+        peephole (typing.Optional[PeepholeOptimizer]): if given, fuses
+            windows of commands before they are translated.
+        tree_shaker (typing.Optional[TreeShaker]): if given, the functions it
+            finds unreachable are not translated. The file must have been
+            added to its call graph.
+        inliner (typing.Optional[Inliner]): if given, replaces calls to small
+            functions with their bodies. Every file must have been added to
+            it.
+        tail_calls (bool): if True, a call followed by a return reuses the
+            frame of the current function.
+        compact_locals (bool): if True, function entries zero their locals
+            with shorter code, or not at all when every local is written
+            before it is read.
+        specialize_segments (bool): if True, pushes and pops use the shortest
+            sequence for their segment and index (with cache_top, only the
+            pops of a value that is not cached in D).
+
+    Returns:
+        typing.Counter[str]: the ROM words saved by each optimization.
     """
     input_filename, input_extension = os.path.splitext(os.path.basename(input_file.name))
 
-    parser = Parser(input_file)
-    code_writer = CodeWriter(output_file)
+    parser = Parser(input_file, streaming=True)
+    code_writer = CodeWriter(output_file, comments, shared_calls, shared_compare, cache_top, tail_calls,
+                             compact_locals, specialize_segments)
     code_writer.set_file_name(input_filename)
 
     if bootstrap:
         code_writer.write_boostrap()
 
-    while True:
-        command_type: str = parser.command_type()
-
-        if command_type == "C_ARITHMETIC":
-            arg1 = parser.arg1()  # The command itself
-            code_writer.write_arithmetic(arg1)
-
-        if command_type in {"C_POP", "C_PUSH"}:
-            arg1 = parser.arg1()
-            arg2 = parser.arg2()
-            code_writer.write_push_pop(command_type, arg1, arg2)
-
-        if command_type == "C_LABEL":
-            code_writer.write_label(parser.arg1())
-
-        if command_type == "C_GOTO":
-            code_writer.write_goto(parser.arg1())
-
-        if command_type == "C_IF":
-            code_writer.write_if(parser.arg1())
-
-        if command_type == "C_FUNCTION":
-            code_writer.write_function(parser.arg1(), parser.arg2())
-
-        if command_type == "C_RETURN":
-            code_writer.write_return()
-
-        if command_type == "C_CALL":
-            code_writer.write_call(parser.arg1(), parser.arg2())
-
-        if not parser.has_more_commands():
-            break
-        parser.advance()
+    commands: typing.Iterable[VMCommand] = parser.commands()
+    removed: typing.List[VMCommand] = list()
+    if tree_shaker is not None:
+        commands = tree_shaker.shake(commands, removed)
+    if inliner is not None:
+        commands = inliner.expand(commands)
+    if tail_calls:
+        commands = find_tail_calls(commands)
+    locals_analyzer = LocalsAnalyzer()
+    if compact_locals:
+        # Before the peephole optimizer, so that every local is still read by a push and written by a pop:
+        commands = locals_analyzer.analyze(commands)
+    if peephole is not None:
+        commands = peephole.optimize(commands)
+    write_commands(code_writer, commands, locals_analyzer.uninitialized)
+    code_writer.flush()
+    if removed:
+        # The eliminated functions are translated the same way, only to count their words:
+        removed_code = io.StringIO()
+        removed_writer = CodeWriter(removed_code, False, shared_calls, shared_compare, cache_top,
+                                    compact_locals=compact_locals, specialize_segments=specialize_segments)
+        removed_writer.set_file_name(input_filename)
+        removed_commands: typing.Iterable[VMCommand] = find_tail_calls(removed) if tail_calls else removed
+        write_commands(removed_writer, PeepholeOptimizer().optimize(removed_commands) if peephole is not None
+                       else removed_commands)
+        removed_writer.flush()
+        code_writer.words_saved.update(removed_writer.words_saved)
+        code_writer.words_saved["tree shaking"] += count_words(removed_code.getvalue())
+    return code_writer.words_saved
 
 
 if "__main__" == __name__:
@@ -72,9 +186,63 @@ if "__main__" == __name__:
     # Both are closed automatically when the code finishes running.
     # If the output file does not exist, it is created automatically in the
     # correct path, using the correct filename.
-    if not len(sys.argv) == 2:
-        sys.exit("Invalid usage, please use: VMtranslator <input path>")
-    argument_path = os.path.abspath(sys.argv[1])
+    # Options:
+    #   --no-comments: write only instructions and labels, without comments.
+    #   --shared-calls: translate calls and returns into jumps to shared
+    #                   $$CALL/$$RETURN routines, and report the ROM words saved.
+    #   --shared-compare: translate eq, gt and lt into jumps to shared
+    #                     routines, and report the ROM words saved.
+    #   --cache-top: keep the top of the stack in D between commands, writing
+    #                it back only at labels, jumps, calls and returns.
+    #   --optimize: fuse common windows of commands (e.g. a push followed by a
+    #               pop) with the peephole optimizer, and report how often each
+    #               rule fired.
+    #   --tree-shake: read all the files first, translate only the functions
+    #                 that Sys.init may reach, and report the eliminated ones.
+    #   --inline[=N]: replace calls to functions that call no other function
+    #                 with their bodies, when that adds at most N ROM words
+    #                 per call site (0 by default), and report the decision
+    #                 about every called function with its size in words.
+    #   --tail-calls: translate a call that is immediately followed by a
+    #                 return into a jump that reuses the current frame, so
+    #                 the stack does not grow in tail recursion.
+    #   --compact-locals: zero the locals of a function with an unrolled run
+    #                     or a loop, chosen by their number, or not at all if
+    #                     every local is written before it is read.
+    #   --specialize-segments: translate every push and pop with the shortest
+    #                          sequence for its segment and index, and report
+    #                          the ROM words saved. With --cache-top, pushes
+    #                          keep loading into D, and only pops of a value
+    #                          that is not cached in D are specialized.
+    usage = "Invalid usage, please use: VMtranslator [--no-comments] [--shared-calls] [--shared-compare] " \
+            "[--cache-top] [--optimize] [--tree-shake] [--inline[=N]] [--tail-calls] [--compact-locals] " \
+            "[--specialize-segments] <input path>"
+    arguments = [argument for argument in sys.argv[1:] if not argument.startswith("--")]
+    options = dict(argument.partition("=")[::2] for argument in sys.argv[1:] if argument.startswith("--"))
+    known_options = {"--no-comments", "--shared-calls", "--shared-compare", "--cache-top", "--optimize",
+                     "--tree-shake", "--inline", "--tail-calls", "--compact-locals",
+                     "--specialize-segments"}
+    if not len(arguments) == 1 or not options.keys() <= known_options:
+        sys.exit(usage)
+    if options.get("--inline") and not options["--inline"].isnumeric():
+        sys.exit(usage)
+    comments = "--no-comments" not in options
+    shared_calls = "--shared-calls" in options
+    shared_compare = "--shared-compare" in options
+    cache_top = "--cache-top" in options
+    peephole = PeepholeOptimizer() if "--optimize" in options else None
+    tree_shaker = TreeShaker() if "--tree-shake" in options else None
+    tail_calls = "--tail-calls" in options
+    compact_locals = "--compact-locals" in options
+    specialize_segments = "--specialize-segments" in options
+    inliner = None
+    if "--inline" in options:
+        # Inlined bodies are measured as they will be translated:
+        code_size = functools.partial(translated_words, shared_calls=shared_calls, shared_compare=shared_compare,
+                                      cache_top=cache_top, tail_calls=tail_calls, compact_locals=compact_locals,
+                                      specialize_segments=specialize_segments)
+        inliner = Inliner(code_size, int(options["--inline"])) if options["--inline"] else Inliner(code_size)
+    argument_path = os.path.abspath(arguments[0])
     if os.path.isdir(argument_path):
         files_to_translate = [
             os.path.join(argument_path, filename)
@@ -85,15 +253,38 @@ if "__main__" == __name__:
         files_to_translate = [argument_path]
         output_path, extension = os.path.splitext(argument_path)
     output_path += ".asm"
+    vm_paths = [input_path for input_path in files_to_translate if os.path.splitext(input_path)[1].lower() == ".vm"]
+    if inliner is not None:
+        for input_path in vm_paths:
+            with open(input_path, 'r') as input_file:
+                inliner.add_file(os.path.splitext(os.path.basename(input_path))[0], Parser.parse(input_file))
+    if tree_shaker is not None:
+        for input_path in vm_paths:
+            with open(input_path, 'r') as input_file:
+                # Calls that are inlined are not calls anymore:
+                tree_shaker.add_file(command for command in Parser.parse(input_file)
+                                     if inliner is None or command.kind != CommandType.C_CALL
+                                     or not inliner.inlines(command.arg1, command.arg2))
     bootstrap = True
+    words_saved: typing.Counter[str] = collections.Counter()
     with open(output_path, 'w') as output_file:
         for input_path in files_to_translate:
             filename, extension = os.path.splitext(input_path)
             if extension.lower() != ".vm":
                 continue
             with open(input_path, 'r') as input_file:
-                translate_file(input_file, output_file, bootstrap)
+                words_saved.update(translate_file(input_file, output_file, bootstrap, comments, shared_calls,
+                                                  shared_compare, cache_top, peephole, tree_shaker, inliner,
+                                                  tail_calls, compact_locals, specialize_segments))
             bootstrap = False
+    for optimization, saved in words_saved.items():
+        print("{}: {} ROM words saved".format(optimization, saved))
+    if peephole is not None:
+        print("peephole: {}".format(peephole.report()))
+    if tree_shaker is not None:
+        print("tree shaking: {}".format(tree_shaker.report()))
+    if inliner is not None:
+        print(inliner.report())
 
 if "__main__no_bootsrap" == __name__:
     # Parses the input path and calls translate_file on each input file.
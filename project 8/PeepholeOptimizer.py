@@ -0,0 +1,142 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import collections
+import typing
+from Parser import CommandType, VMCommand
+
+# Groups of words that a "{X:group}" token may match.
+GROUPS = {
+    "memory": {"local", "argument", "this", "that", "static", "temp", "pointer"},
+    "source": {"local", "argument", "this", "that", "static", "temp", "pointer", "constant"},
+    "binary": {"add", "sub", "and", "or"},
+    "step": {"add", "sub"},
+}
+
+# Each rule is (name, pattern). A pattern is a window of consecutive VM
+# commands, each given as its words: "{X}" matches any word and binds X to it,
+# "{X:group}" matches only the words of GROUPS[group], and a name used twice
+# must bind the same word both times. Every other word must match exactly.
+# The static segment of another file (in inlined code) is the word
+# "static@File", which belongs to the groups that "static" belongs to.
+# A matched window is translated as a single command by CodeWriter.write_fused
+# (with the rule's name and bindings). Rules are tried in order, so a longer
+# rule must come before the shorter ones that match its beginning.
+RULES = [
+    # x = x + 1 and x = x - 1:
+    ("increment",
+     (("push", "{S:memory}", "{I}"), ("push", "constant", "1"), ("{OP:step}",), ("pop", "{S}", "{I}"))),
+    # A value moved from one place to another (e.g. "push argument 0" followed
+    # by "pop pointer 0"), without going through the stack:
+    ("move",
+     (("push", "{S:source}", "{I}"), ("pop", "{T:memory}", "{J}"))),
+    # A binary operation whose second operand is a constant or a variable,
+    # computed right into the first operand on the stack:
+    ("operand",
+     (("push", "{S:source}", "{I}"), ("{OP:binary}",))),
+]
+
+
+class FusedCommand(VMCommand):
+    """A window of VM commands that matched a peephole rule, translated as a
+    single command.
+    """
+    __slots__ = ("values",)
+
+    def __init__(self, rule: str, values: typing.Dict[str, str]) -> None:
+        """
+        Args:
+            rule (str): the name of the rule that matched.
+            values (typing.Dict[str, str]): the words bound by the rule.
+        """
+        super().__init__(CommandType.C_FUSED, rule)
+        self.values = values
+
+
+class PeepholeOptimizer:
+    """Replaces short windows of VM commands with fused commands, according to
+    RULES. Patterns hold only push, pop and arithmetic commands, so a window
+    never spans a label, a jump, a call or a function boundary.
+    """
+
+    def __init__(self, rules: typing.Sequence[tuple] = RULES) -> None:
+        """
+        Args:
+            rules (typing.Sequence[tuple]): the rule table to apply.
+        """
+        self.__rules = rules
+        self.__longest = max(len(pattern) for _, pattern in rules)
+        self.fused = 0
+        self.fired: typing.Counter[str] = collections.Counter()
+
+    def optimize(self, commands: typing.Iterable[VMCommand]) -> typing.Iterator[VMCommand]:
+        """Lazily applies the rules to a stream of commands, keeping only a
+        window of the longest pattern's length in memory.
+
+        Args:
+            commands (typing.Iterable[VMCommand]): the commands of a file.
+
+        Yields:
+            VMCommand: the commands that matched no rule, as they are, and a
+            FusedCommand for every window that did.
+        """
+        commands = iter(commands)
+        window: typing.Deque[VMCommand] = collections.deque()
+        while True:
+            while len(window) < self.__longest:
+                command = next(commands, None)
+                if command is None:
+                    break
+                window.append(command)
+            if not window:
+                return
+            for name, pattern in self.__rules:
+                values = PeepholeOptimizer.__match(window, pattern)
+                if values is not None:
+                    for _ in pattern:
+                        window.popleft()
+                    self.fired[name] += 1
+                    self.fused += len(pattern)
+                    yield FusedCommand(name, values)
+                    break
+            else:
+                yield window.popleft()
+
+    @staticmethod
+    def __match(window: typing.Deque[VMCommand],
+                pattern: typing.Sequence[typing.Sequence[str]]) -> typing.Optional[typing.Dict[str, str]]:
+        if len(window) < len(pattern):
+            return None
+        values: typing.Dict[str, str] = dict()
+        for words, command in zip(pattern, window):
+            if words[0] == "push" or words[0] == "pop":
+                if command.kind != (CommandType.C_PUSH if words[0] == "push" else CommandType.C_POP):
+                    return None
+                segment = command.arg1 if command.static_file is None else command.arg1 + "@" + command.static_file
+                operands = (segment, str(command.arg2))
+            elif command.kind == CommandType.C_ARITHMETIC:
+                operands = (command.arg1,)
+                words = ("",) + tuple(words)  # Aligns the command with its operand list
+            else:
+                return None
+            for token, word in zip(words[1:], operands):
+                if not token.startswith("{"):
+                    if token != word:
+                        return None
+                    continue
+                name, _, group = token[1:-1].partition(":")
+                if (group and word.partition("@")[0] not in GROUPS[group]) or values.setdefault(name, word) != word:
+                    return None
+        return values
+
+    def report(self) -> str:
+        """
+        Returns:
+            str: how many commands were fused, and by which rules.
+        """
+        fired = ", ".join("{} x{}".format(name, count) for name, count in self.fired.most_common())
+        return "fused {} commands ({})".format(self.fused, fired or "no rule fired")
@@ -0,0 +1,99 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import typing
+from Parser import CommandType, VMCommand
+
+# The function the bootstrap code calls.
+ENTRY_FUNCTION = "Sys.init"
+
+
+class TreeShaker:
+    """Removes the functions that the program can never call.
+
+    The whole program is read first, to build its call graph from its
+    "function" and "call" commands. Starting from the entry function, a
+    function is reachable if a reachable function calls it. VM code has no
+    function pointers, so every call is known up front. If the program does
+    not define the entry function, every function is kept.
+    """
+
+    def __init__(self, entry: str = ENTRY_FUNCTION) -> None:
+        """
+        Args:
+            entry (str): the function the program starts at.
+        """
+        self.__entry = entry
+        self.__calls: typing.Dict[str, typing.Set[str]] = dict()
+        self.__reachable: typing.Optional[typing.Set[str]] = None
+        self.eliminated: typing.List[str] = list()
+
+    def add_file(self, commands: typing.Iterable[VMCommand]) -> None:
+        """Adds the functions of a file to the call graph. Must be called for
+        every file before any of them is shaken.
+
+        Args:
+            commands (typing.Iterable[VMCommand]): the commands of the file.
+        """
+        callees: typing.Set[str] = set()  # Calls made before the first function are never reached
+        for command in commands:
+            if command.kind == CommandType.C_FUNCTION:
+                callees = self.__calls.setdefault(command.arg1, set())
+            elif command.kind == CommandType.C_CALL:
+                callees.add(command.arg1)
+
+    def reachable(self) -> typing.Set[str]:
+        """
+        Returns:
+            typing.Set[str]: the functions the program may call.
+        """
+        if self.__reachable is None:
+            if self.__entry not in self.__calls:
+                self.__reachable = set(self.__calls)
+            else:
+                self.__reachable = set()
+                pending = [self.__entry]
+                while pending:
+                    function = pending.pop()
+                    if function in self.__reachable:
+                        continue
+                    self.__reachable.add(function)
+                    pending.extend(self.__calls.get(function, ()))
+        return self.__reachable
+
+    def shake(self, commands: typing.Iterable[VMCommand],
+              removed: typing.Optional[typing.List[VMCommand]] = None) -> typing.Iterator[VMCommand]:
+        """Lazily drops the unreachable functions from the commands of a file.
+
+        Args:
+            commands (typing.Iterable[VMCommand]): the commands of a file that
+                was added to the call graph.
+            removed (typing.Optional[typing.List[VMCommand]]): if given, the
+                dropped commands are appended to it.
+
+        Yields:
+            VMCommand: the commands of the reachable functions.
+        """
+        reachable = self.reachable()
+        keep = True
+        for command in commands:
+            if command.kind == CommandType.C_FUNCTION:
+                keep = command.arg1 in reachable
+                if not keep:
+                    self.eliminated.append(command.arg1)
+            if keep:
+                yield command
+            elif removed is not None:
+                removed.append(command)
+
+    def report(self) -> str:
+        """
+        Returns:
+            str: the eliminated functions.
+        """
+        return "eliminated {} functions{}".format(
+            len(self.eliminated), (": " + ", ".join(sorted(self.eliminated))) if self.eliminated else "")
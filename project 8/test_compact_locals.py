@@ -0,0 +1,68 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import io
+import os
+import tempfile
+import unittest
+import CycleBenchmark
+from LocalsAnalyzer import LocalsAnalyzer
+from Parser import Parser
+from PeepholeOptimizer import PeepholeOptimizer
+
+# Main.dirty leaves 9s above the stack, where the local of Main.count is
+# allocated next. Main.count reads its local before it writes it, in a window
+# that the peephole optimizer fuses into a single increment.
+PROGRAM = """
+function Sys.init 0
+call Main.dirty 0
+pop temp 0
+call Main.count 0
+pop temp 0
+call Sys.halt 0
+function Sys.halt 0
+label LOOP
+goto LOOP
+function Main.dirty 0
+""" + "push constant 9\n" * 10 + "pop temp 1\n" * 9 + """
+return
+function Main.count 1
+push local 0
+push constant 1
+add
+pop local 0
+push local 0
+pop static 0
+push static 0
+return
+"""
+
+
+class CompactLocalsTest(unittest.TestCase):
+    """Regression tests for --compact-locals combined with --optimize."""
+
+    def test_fused_read_before_write(self) -> None:
+        # The analysis must see the read hidden in the fused increment:
+        analyzer = LocalsAnalyzer()
+        list(analyzer.analyze(PeepholeOptimizer().optimize(Parser.parse(io.StringIO(PROGRAM)))))
+        self.assertNotIn("Main.count", analyzer.uninitialized)
+
+    def test_same_statics_as_default(self) -> None:
+        with tempfile.TemporaryDirectory() as vm_directory:
+            with open(os.path.join(vm_directory, "Sys.vm"), 'w') as vm_file:
+                vm_file.write(PROGRAM)
+            results = list()
+            for options in ([], ["--optimize", "--compact-locals"]):
+                words, halt_addresses, variables = CycleBenchmark.build(vm_directory, options)
+                _, halted, ram = CycleBenchmark.run(words, halt_addresses, 10000)
+                self.assertTrue(halted)
+                results.append({variable: ram[address] for variable, address in variables.items()})
+        self.assertEqual(results[0], results[1])
+
+
+if "__main__" == __name__:
+    unittest.main()